@@ -0,0 +1,48 @@
+from collections import OrderedDict
+from hashlib import blake2b
+
+
+class FitnessCache:
+    # Bounded cache of fitness values keyed by genome digest, evicting the least recently used entry when full
+    #
+    # Cached values are only exact when a genome's fitness is deterministic, i.e. when every genome is evaluated
+    # on the same fixed set of worlds. Otherwise the first sampled fitness of a genome is reused
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def key(genome, context=b""):
+        # Return a short digest identifying a genome, and optionally the context (such as the worlds) it is evaluated in
+        digest = blake2b(genome, digest_size=16)
+        digest.update(context)
+        return digest.digest()
+
+    def get(self, key):
+        # Return the cached fitness for a key and mark it as recently used, or None if it isn't cached
+
+        fitness = self.entries.get(key)
+        if fitness is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return fitness
+
+    def put(self, key, fitness):
+        # Cache a fitness value, evicting the least recently used entries if the cache is over its size limit
+
+        self.entries[key] = fitness
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
@@ -0,0 +1,144 @@
+import os
+import struct
+
+import numpy as np
+
+# File layout: a fixed-size header followed by the population matrix (one row of action codes per genome), the
+# fitness values as float64, the best genome, the Mersenne Twister state of the random module as uint32 words and
+# the state of the trainer's RandomStream
+HEADER_FORMAT = "<8sIIIIQdd??IIQ"
+HEADER_SIZE = 72
+MAGIC = b"ROBBYCKP"
+RANDOM_STATE_WORDS = 625
+
+
+class Checkpoint:
+    # A snapshot of a training run between generations, from which it can be resumed exactly
+    #
+    # It holds the population at the start of a generation, the sorted fitness values of the generation it was bred
+    # from (none for the first generation), the all-time best (genome, fitness) tuple, the state of the random
+    # module, the world bank offset and the state of the trainer's RandomStream, from which every random number used
+    # in training is drawn, so restoring them is enough to continue bit-for-bit. The seed of the world bank is kept
+    # too, so that a bank generated when the trainer was made can be generated again
+
+    def __init__(self, generation, population, fitness_values, best_genome, random_state, bank_offset=0,
+                 stream_state=b"", bank_seed=0):
+        self.generation = generation
+        self.population = population
+        self.fitness_values = fitness_values
+        self.best_genome = best_genome
+        self.random_state = random_state
+        self.bank_offset = bank_offset
+        self.stream_state = stream_state
+        self.bank_seed = bank_seed
+
+    @classmethod
+    def load(cls, filename):
+        # Return the checkpoint saved in a file
+
+        with open(filename, "rb") as f:
+            data = f.read()
+        magic, generation, pop_size, genome_length, num_fitness_values, bank_offset, best_fitness, gauss_next, \
+            integral, has_gauss, version, stream_state_size, bank_seed = struct.unpack_from(HEADER_FORMAT, data)
+        if magic != MAGIC:
+            raise ValueError(f"{filename} is not a checkpoint file")
+
+        offset = HEADER_SIZE
+        population = np.frombuffer(data, np.uint8, pop_size * genome_length, offset).reshape(pop_size, genome_length)
+        offset += population.nbytes
+        fitness_values = np.frombuffer(data, np.float64, num_fitness_values, offset).tolist()
+        offset += num_fitness_values * 8
+        best_genome = data[offset:offset + genome_length]
+        offset += genome_length
+        words = tuple(np.frombuffer(data, np.uint32, RANDOM_STATE_WORDS, offset).tolist())
+        offset += RANDOM_STATE_WORDS * 4
+        stream_state = data[offset:offset + stream_state_size]
+
+        # Fitness values are stored as floats, but were ints if every one of them was
+        if integral:
+            fitness_values = [int(value) for value in fitness_values]
+            best_fitness = int(best_fitness)
+        random_state = (version, words, gauss_next if has_gauss else None)
+        best_genome = (best_genome, best_fitness)
+        return cls(
+            generation, population.copy(), fitness_values, best_genome, random_state, bank_offset, stream_state, bank_seed
+        )
+
+    def save(self, filename):
+        # Write the checkpoint to a file atomically, by writing a temporary file and then renaming it over the old one
+
+        best_genome, best_fitness = self.best_genome
+        version, words, gauss_next = self.random_state
+        integral = all(isinstance(value, int) for value in self.fitness_values) and isinstance(best_fitness, int)
+        pop_size, genome_length = self.population.shape
+        header = struct.pack(
+            HEADER_FORMAT, MAGIC, self.generation, pop_size, genome_length, len(self.fitness_values), self.bank_offset,
+            best_fitness, gauss_next or 0.0, integral, gauss_next is not None, version, len(self.stream_state),
+            self.bank_seed
+        )
+
+        temp_filename = filename + ".tmp"
+        with open(temp_filename, "wb") as f:
+            f.write(header.ljust(HEADER_SIZE, b"\0"))
+            f.write(np.ascontiguousarray(self.population, dtype=np.uint8).tobytes())
+            f.write(np.array(self.fitness_values, dtype=np.float64).tobytes())
+            f.write(bytes(best_genome).ljust(genome_length, b"\0"))
+            f.write(np.array(words, dtype=np.uint32).tobytes())
+            f.write(self.stream_state)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_filename, filename)
+
+
+if __name__ == "__main__":
+    # Check that a run stopped and resumed twice, the second time interrupted before finishing a generation, gives
+    # the same records as an uninterrupted run, both generationally and in steady-state mode
+    import os
+    import random
+    import tempfile
+
+    import crossover
+    import fitness
+    import selection
+    from robby.headless import HeadlessWorld
+    from robby.randomstream import RandomStream
+    from robby_trainer import RobbyTrainer
+
+    def make_trainer(steady_state):
+        # Built from a different random state every time, as in a new process
+        random.seed(os.urandom(8))
+        return RobbyTrainer(HeadlessWorld(10, 10), None, 0.005, crossover.KPointCrossover(),
+                            selection.RankedChoiceSelection(), fitness.PunishWallHits(), steady_state=steady_state,
+                            rng=RandomStream(1))
+
+    def summary(records):
+        return [(r.generation, r.mean_fitness, r.champion, r.best) for r in records]
+
+    def interrupt_first_evaluation(trainer):
+        # Make the trainer's next evaluation raise KeyboardInterrupt, as if Ctrl-C was pressed during it
+        def interrupted(genomes):
+            del trainer.sort_by_fitness
+            raise KeyboardInterrupt
+        trainer.sort_by_fitness = interrupted
+
+    filename = os.path.join(tempfile.mkdtemp(), "check.ckp")
+    for steady_state in (0, 5):
+        expected = summary(make_trainer(steady_state).iter_train(30, 8))
+
+        # Stop after 3 generations, which saves a checkpoint of the start of the fourth
+        run = make_trainer(steady_state).iter_train(30, 8, filename)
+        records = [next(run) for _ in range(3)]
+        run.close()
+
+        # Resume, and be interrupted during the first evaluation
+        trainer = make_trainer(steady_state)
+        interrupt_first_evaluation(trainer)
+        try:
+            records += list(trainer.iter_train(30, 8, filename, resume_from=filename))
+        except KeyboardInterrupt:
+            pass
+
+        # Resume again and finish
+        records += make_trainer(steady_state).iter_train(30, 8, filename, resume_from=filename)
+        assert summary(records) == expected, f"resumed run differs with steady_state={steady_state}"
+    print("Resumed runs match uninterrupted runs")
@@ -1,11 +1,43 @@
-from random import randrange, random, choice
+import numpy as np
+
+from robby.randomstream import RandomStream
 
 
 class CrossoverFunc:
     # Base class, if used will simply return the first provided genome
+    #
+    # Crossover works on a whole generation at once: batch() takes a (pop, 243) population matrix and arrays of
+    # parent indices, and builds a boolean mask per child that is True where the child takes its action code from
+    # the first parent. Subclasses only need to override mask()
+    #
+    # Random numbers come from the rng passed in (a RandomStream or NumPy generator), or a new RandomStream
+    # seeded from the random module if none is given
+
+    crossover_rate = 1
+
+    def __call__(self, g1, g2, rng=None):
+        # Return the offspring of a single pair of parent genomes, by crossing over a batch of one
+        population = np.frombuffer(bytes(g1) + bytes(g2), dtype=np.uint8).reshape(2, -1)
+        return self.batch(population, [0], [1], rng)[0].tobytes()
+
+    def mask(self, rng, count, length):
+        # Return a (count, length) boolean mask that is True wherever offspring take from the first parent
+        return np.ones((count, length), dtype=bool)
+
+    def batch(self, population, parents1, parents2, rng=None):
+        # Return a matrix holding one offspring genome for each pair of parent indices
+
+        if rng is None:
+            rng = RandomStream()
 
-    def __call__(self, g1, g2):
-        return g1
+        g1 = population[parents1]
+        g2 = population[parents2]
+        mask = self.mask(rng, len(g1), population.shape[1])
+
+        # Only crossover when guided to by crossover_rate, otherwise the offspring is a copy of g1
+        mask |= (rng.random(len(g1)) > self.crossover_rate)[:, np.newaxis]
+
+        return np.where(mask, g1, g2)
 
 
 class SinglePointCrossover(CrossoverFunc):
@@ -14,15 +46,10 @@ class SinglePointCrossover(CrossoverFunc):
     def __init__(self, crossover_rate=1):
         self.crossover_rate = crossover_rate
 
-    def __call__(self, g1, g2):
-        # Only crossover when guided to by crossover_rate
-        if random() > self.crossover_rate:
-            return g1
-
-        # Generate crossover point and create offspring genome from g1 before point and g2 after
-        point = randrange(len(g1))
-        offspring_genome = g1[:point] + g2[point:]
-        return offspring_genome
+    def mask(self, rng, count, length):
+        # Generate a crossover point per offspring and take from g1 before the point and g2 after
+        points = rng.integers(0, length, count)
+        return np.arange(length) < points[:, np.newaxis]
 
 
 class KPointCrossover(CrossoverFunc):
@@ -32,42 +59,27 @@ class KPointCrossover(CrossoverFunc):
         self.crossover_rate = crossover_rate
         self.num_points = num_points
 
-    def __call__(self, g1, g2):
-        # Only crossover when guided to by crossover_rate
-        if random() > self.crossover_rate:
-            return g1
-
-        offspring_genome = ""
-        last_point = 0
-        using_g1 = True
-
-        # Generate k points and build the new genome based on alternating parent genomes per point range
+    def mask(self, rng, count, length):
+        # Generate k points per offspring, each uniformly chosen between the previous point and the end of the genome
+        last_points = np.zeros(count, dtype=np.int64)
+        points = []
         for _ in range(self.num_points - 1):
-            next_point = randrange(last_point, len(g1))
-            offspring_genome += g1[last_point:next_point] if using_g1 else g2[last_point:next_point]
-            last_point = next_point
-            using_g1 = not using_g1
-
-        # Make sure the sequence adds the last bit of the parent genome - otherwise it will be too short
-        offspring_genome += g1[last_point:] if using_g1 else g2[last_point:]
+            last_points = last_points + (rng.random(count) * (length - last_points)).astype(np.int64)
+            points.append(last_points)
 
-        return offspring_genome
+        # Parent genomes alternate at each point, so g1 is used wherever an even number of points has been passed
+        passed = np.zeros((count, length), dtype=np.int64)
+        for point in points:
+            passed += np.arange(length) >= point[:, np.newaxis]
+        return passed % 2 == 0
 
 
 class UniformCrossover(CrossoverFunc):
-    # Generate offspring genome by randomly choosing from either parent for each character in genome
+    # Generate offspring genome by randomly choosing from either parent for each action code in genome
 
     def __init__(self, crossover_rate=1):
         self.crossover_rate = crossover_rate
 
-    def __call__(self, g1, g2):
-        # Only crossover when guided to by crossover_rate
-        if random() > self.crossover_rate:
-            return g1
-
-        # Iterate over length of genome and add to offspring from either parent based on a random choice
-        offspring_genome = ""
-        for i in range(len(g1)):
-            use_g1 = choice([True, False])
-            offspring_genome += g1[i] if use_g1 else g2[i]
-        return offspring_genome
+    def mask(self, rng, count, length):
+        # Choose between the parents with equal probability for every action code of every offspring
+        return rng.random((count, length)) < 0.5
@@ -0,0 +1,170 @@
+import numpy as np
+
+from fitness import NUM_ACTIONS
+from robby.headless import EMPTY, CAN, WALL, PICK_UP_CAN, MOVE_RANDOM
+
+# Base-3 weight of each cell in the percept code, in percept order (north, south, east, west, here)
+PERCEPT_WEIGHTS = (81, 27, 9, 3, 1)
+
+
+class BatchEvaluator:
+    # Evaluate a whole population at once by running every genome in its own world, all advanced in lockstep
+    #
+    # Worlds are stored as a (pop, rows + 2, cols + 2) uint8 array with a border of WALL cells, so that percepts
+    # and wall hits need no bounds checks: a move into a WALL cell is simply not taken
+    #
+    # Robots that fall into a deterministic loop are detected with the same cycle check as RobbyTrainer.get_fitness,
+    # have the reward of their remaining steps extrapolated, and are dropped from the simulation
+
+    def __init__(self, num_rows, num_cols, reward_func, can_fill_rate=0.25, steps=200):
+        self.num_rows = num_rows
+        self.num_cols = num_cols
+        self.reward_func = reward_func
+        self.can_fill_rate = can_fill_rate
+        self.steps = steps
+
+        # Offset in the flattened padded grid of each cell in the percept, and of the cell each action moves to
+        stride = num_cols + 2
+        self.percept_offsets = (-stride, stride, 1, -1, 0)
+        self.move_offsets = np.array([-stride, stride, 1, -1, 0, 0, 0])
+
+    def generate_worlds(self, seeds, layouts=None):
+        # Return a (pop, rows + 2, cols + 2) array of worlds surrounded by walls, and a (pop, steps) array of the
+        # directions of the first, second, ... MoveRandom of each robot, drawing world i from its own generator seeded
+        # with seeds[i] so that results do not depend on which other genomes share the batch
+        # If given a (pop, rows * cols) array of can layouts, those are used instead of freshly distributed cans
+        #
+        # The draws are the same as those of a HeadlessWorld with a RandomStream seeded with the same seed: one float
+        # per cell for the cans, then one float per random move, so rewards match RobbyTrainer.get_fitness exactly
+
+        pop = len(seeds)
+        worlds = np.full((pop, self.num_rows + 2, self.num_cols + 2), WALL, dtype=np.uint8)
+        if layouts is not None:
+            worlds[:, 1:-1, 1:-1] = layouts.reshape(pop, self.num_rows, self.num_cols)
+        directions = np.empty((pop, self.steps), dtype=np.intp)
+        for i, seed in enumerate(seeds):
+            rng = np.random.default_rng(seed)
+            if layouts is None:
+                cans = rng.random((self.num_rows, self.num_cols)) < self.can_fill_rate
+                worlds[i, 1:-1, 1:-1] = np.where(cans, CAN, EMPTY)
+            directions[i] = rng.random(self.steps) * 4
+        return worlds, directions
+
+    def __call__(self, genomes, seeds, layouts=None):
+        # Return the cumulative reward of each row of a (pop, 243) uint8 matrix of action codes, with row i run in a
+        # world generated from seeds[i], or with can layout layouts[i] if given
+
+        pop = len(genomes)
+        worlds, directions = self.generate_worlds(seeds, layouts)
+        cells = worlds.reshape(-1)
+        world_size = worlds[0].size
+
+        # Robots still being simulated, by row in genomes, and the index of each in the flattened worlds array,
+        # starting in the top left corner of its own world
+        rows = np.arange(pop)
+        pos = rows * world_size + (self.num_cols + 2) + 1
+
+        # Reward of each (percept, action) pair, indexed by percept * NUM_ACTIONS + action
+        reward_table = np.array(self.reward_func.table, dtype=np.int64)
+
+        # Cumulative reward of every robot after each step, and number of cans each robot has picked up
+        totals = np.zeros((self.steps + 1, pop), dtype=np.int64)
+        rewards = np.zeros(pop, dtype=np.int64)
+        picked = np.zeros(pop, dtype=np.int64)
+
+        # Cycle check state (see RobbyTrainer.get_fitness), one saved state per robot
+        saved_state = picked * cells.size + pos
+        saved_step = np.zeros(pop, dtype=np.int64)
+        period = np.ones(pop, dtype=np.int64)
+
+        # Number of random moves each robot has made, which is its index into its row of directions
+        random_count = np.zeros(pop, dtype=np.intp)
+
+        final_rewards = np.zeros(pop, dtype=np.int64)
+        for step in range(self.steps):
+            # Encode the percept of every robot and look up the action each genome takes for it
+            percept = np.zeros(len(rows), dtype=np.intp)
+            for weight, offset in zip(PERCEPT_WEIGHTS, self.percept_offsets):
+                percept += weight * cells[pos + offset]
+            actions = genomes[rows, percept]
+
+            # Reward is decided from the chosen action before random moves are resolved, as in FitnessFunc
+            rewards += reward_table[percept * NUM_ACTIONS + actions]
+            target = pos + self.move_offsets[actions]
+            target_contents = cells[target]
+
+            # Resolve random moves, then move every robot whose target cell is not a wall
+            random_moves = actions == MOVE_RANDOM
+            if random_moves.any():
+                target = np.where(random_moves, pos + self.move_offsets[directions[rows, random_count]], target)
+                target_contents = cells[target]
+                random_count += random_moves
+            pos = np.where(target_contents == WALL, pos, target)
+
+            # Pick up any can under robots that chose to
+            pickups = actions == PICK_UP_CAN
+            picked += pickups & (cells[pos] == CAN)
+            cells[pos[pickups]] = EMPTY
+
+            t = step + 1
+            totals[t, rows] = rewards
+
+            # Check for robots back in their saved state, and save the current state where the check restarts
+            state = picked * cells.size + pos
+            looped = (state == saved_state) & ~random_moves
+            restart = (random_moves | (t - saved_step == period)) & ~looped
+            saved_state = np.where(restart, state, saved_state)
+            saved_step = np.where(restart, t, saved_step)
+            period = np.where(random_moves, 1, np.where(restart, 2 * period, period))
+
+            # Extrapolate the rewards of looping robots and stop simulating them
+            if looped.any():
+                done = rows[looped]
+                start = saved_step[looped]
+                remaining = self.steps - t
+                cycle_reward = totals[t, done] - totals[start, done]
+                partial_reward = totals[start + remaining % (t - start), done] - totals[start, done]
+                final_rewards[done] = totals[t, done] + remaining // (t - start) * cycle_reward + partial_reward
+                keep = ~looped
+                rows, pos, rewards, picked = rows[keep], pos[keep], rewards[keep], picked[keep]
+                random_count = random_count[keep]
+                saved_state, saved_step, period = saved_state[keep], saved_step[keep], period[keep]
+                if len(rows) == 0:
+                    break
+
+        final_rewards[rows] = rewards
+        return final_rewards
+
+
+if __name__ == "__main__":
+    # Check that batched rewards match those of RobbyTrainer.get_fitness for the same seeds, in headless and bitboard
+    # worlds, with and without bank worlds, for random genomes and for Melanie Mitchell's strategy (which makes random
+    # moves)
+    import random
+
+    import crossover
+    import fitness
+    import selection
+    from genome import from_string
+    from robby import World
+    from robby.bitboard import BitboardWorld
+    from robby.headless import HeadlessWorld
+    from robby_trainer import RobbyTrainer
+
+    random.seed(0)
+    for world_class, reward_func in [(world_class, reward_func) for world_class in (HeadlessWorld, BitboardWorld)
+                                     for reward_func in (fitness.RewardCanCollecting(), fitness.PunishWallHits())]:
+        trainer = RobbyTrainer(world_class(10, 10), None, 0.005, crossover.CrossoverFunc(),
+                               selection.SelectionFunc(), reward_func)
+        evaluator = BatchEvaluator(10, 10, reward_func)
+        genomes = np.vstack([RobbyTrainer.generate_population(199), np.frombuffer(from_string(World.strategyM),
+                                                                                    dtype=np.uint8)])
+        seeds = trainer.rng.seeds(len(genomes))
+        layouts = np.frombuffer(np.random.default_rng(0).random((len(genomes), 100)) < 0.5, dtype=np.uint8)
+        layouts = layouts.reshape(len(genomes), 100)
+
+        scalar = [trainer.get_fitness(g.tobytes(), s) for g, s in zip(genomes, seeds)]
+        assert evaluator(genomes, seeds).tolist() == scalar, "batched rewards differ from scalar rewards"
+        scalar = [trainer.get_fitness(g.tobytes(), s, l.tobytes()) for g, s, l in zip(genomes, seeds, layouts)]
+        assert evaluator(genomes, seeds, layouts).tolist() == scalar, "batched rewards differ on bank worlds"
+    print("Batched rewards match scalar rewards")
@@ -1,8 +1,17 @@
+from robby.headless import ACTION_CODES, CAN, EMPTY, WALL, POSSIBLE_ACTIONS
+
+NUM_PERCEPTS = 243
+NUM_ACTIONS = len(POSSIBLE_ACTIONS)
 
 
 class FitnessFunc:
     # Base class, if used as-is will give no reward value for the given action
     # Constructor can be used to build a custom fitness function
+    #
+    # The reward of a step only depends on the percept and the action, so the rules in reward() are compiled into a
+    # flat table indexed by percept_code * NUM_ACTIONS + action_code, which is all the trainer uses on each step.
+    # Subclasses customize the rules by overriding reward() or changing the reward attributes, and the table is
+    # rebuilt automatically the next time it is used
     def __init__(
             self,
             wall_hit_reward=0,
@@ -15,39 +24,59 @@ class FitnessFunc:
         self.pick_up_can_reward = pick_up_can_reward
         self.fail_pickup_reward = fail_pickup_reward
 
+    def __setattr__(self, name, value):
+        # Changing any reward parameter invalidates the compiled table
+        super().__setattr__(name, value)
+        if name != "_table":
+            super().__setattr__("_table", None)
+
+    @property
+    def table(self):
+        # Return the flat reward table, compiling it first if needed
+        if self._table is None:
+            self._table = self.compile()
+        return self._table
+
+    def compile(self):
+        # Build the reward table by applying the rules to every (percept, action) pair
+        return [self.reward(code, action) for code in range(NUM_PERCEPTS) for action in POSSIBLE_ACTIONS]
+
     def __call__(self, world, action):
-        # Return the reward value of an action
+        # Return the reward value of an action in the world's current state
+        return self.table[world.perceptCode * NUM_ACTIONS + ACTION_CODES[action]]
+
+    def reward(self, code, action):
+        # Return the reward value of taking an action given the percept code of Robby's surroundings
 
-        # Decode percept into the values of each cell around Robby
-        percept = world.getPercept()
-        n = percept[0]
-        s = percept[1]
-        e = percept[2]
-        w = percept[3]
-        h = percept[4]
+        # Decode percept code into the state (EMPTY, CAN or WALL) of each cell around Robby
+        n = code // 81
+        s = code // 27 % 3
+        e = code // 9 % 3
+        w = code // 3 % 3
+        h = code % 3
 
         # Decide value of each action
 
         # Robby runs into a wall
-        if action == "MoveNorth" and world.robbyRow == world.topRow or \
-                action == "MoveSouth" and world.robbyRow == world.bottomRow or \
-                action == "MoveEast" and world.robbyCol == world.rightCol or \
-                action == "MoveWest" and world.robbyCol == world.leftCol:
+        if action == "MoveNorth" and n == WALL or \
+                action == "MoveSouth" and s == WALL or \
+                action == "MoveEast" and e == WALL or \
+                action == "MoveWest" and w == WALL:
             return self.wall_hit_reward
 
         # Robby moves into a cell containing a can
-        if action == "MoveNorth" and n == "C" or \
-                action == "MoveSouth" and s == "C" or \
-                action == "MoveEast" and e == "C" or \
-                action == "MoveWest" and w == "C":
+        if action == "MoveNorth" and n == CAN or \
+                action == "MoveSouth" and s == CAN or \
+                action == "MoveEast" and e == CAN or \
+                action == "MoveWest" and w == CAN:
             return self.move_to_can_reward
 
         # Robby picks up a can
-        if action == "PickUpCan" and h == "C":
+        if action == "PickUpCan" and h == CAN:
             return self.pick_up_can_reward
 
         # Robby tries to pick up a can in an empty cell
-        if action == "PickUpCan" and h == "E":
+        if action == "PickUpCan" and h == EMPTY:
             return self.fail_pickup_reward
 
         return 0
@@ -0,0 +1,36 @@
+from random import randbytes
+
+from fitness import NUM_ACTIONS, NUM_PERCEPTS
+
+# A genome is a bytes object holding one action code (an index into POSSIBLE_ACTIONS, 0-6) for each of the 243
+# percept codes, so looking up an action is a single indexing operation with no character conversion. The string
+# format, one digit per action code, is still used for World.demo() and output files
+
+GENOME_LENGTH = NUM_PERCEPTS
+
+# Translation tables between digit characters and action codes
+_DIGITS_TO_CODES = bytes.maketrans(b"0123456", bytes(range(NUM_ACTIONS)))
+_CODES_TO_DIGITS = bytes.maketrans(bytes(range(NUM_ACTIONS)), b"0123456")
+
+# Map random bytes to action codes with no bias by folding 0-251 onto 0-6 and throwing away 252-255
+_BYTES_TO_CODES = bytes(b % NUM_ACTIONS for b in range(256))
+_UNUSABLE_BYTES = bytes(range(256 - 256 % NUM_ACTIONS, 256))
+
+
+def from_string(genome_string):
+    # Return the genome represented by a string of action code digits
+    return genome_string.encode("ascii").translate(_DIGITS_TO_CODES)
+
+
+def to_string(genome):
+    # Return the string of action code digits representing a genome
+    return bytes(genome).translate(_CODES_TO_DIGITS).decode("ascii")
+
+
+def random_genome(length=GENOME_LENGTH):
+    # Return a genome of uniformly random action codes
+
+    codes = b""
+    while len(codes) < length:
+        codes += randbytes(length).translate(_BYTES_TO_CODES, _UNUSABLE_BYTES)
+    return codes[:length]
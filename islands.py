@@ -0,0 +1,168 @@
+import heapq
+import traceback
+from multiprocessing import get_context
+from queue import Empty
+
+from robby.randomstream import RandomStream
+from training_log import TrainingLog
+
+# Seconds to wait for a message from the islands before checking whether any of them has died
+POLL_INTERVAL = 1.0
+
+
+class IslandModel:
+    # Runs several RobbyTrainers at once, one per process, each evolving its own population (an island), with the
+    # best genomes of every island migrating to the next one around a ring every migration_interval generations
+    #
+    # Islands can be configured differently (crossover, selection, mutation rate and so on) but should share a reward
+    # function, so that fitness values are comparable. Each island logs to its trainer's output file, so every trainer
+    # needs its own. Islands only wait for each other to exchange migrants, so throughput scales with the number of
+    # cores as long as there are at least as many cores as islands
+    #
+    # Migration is synchronous: each island sends its top migrants genomes (with their fitness values) to the next
+    # island and waits for the ones sent by the previous island, which replace some of its population (see
+    # RobbyTrainer.immigrate()). A run is therefore reproducible, and passing a seed gives every island its own
+    # independent stream spawned from it
+    #
+    # Each island keeps the hall_of_fame best distinct genomes it has evaluated, and these are combined into an overall
+    # hall of fame at the end
+    #
+    # If an island raises an exception or dies, run() stops the others and raises a RuntimeError
+
+    def __init__(self, trainers, migration_interval=10, migrants=2, hall_of_fame=10, seed=None):
+        self.trainers = trainers
+        self.migration_interval = migration_interval
+        self.migrants = migrants
+        self.hall_of_fame = hall_of_fame
+
+        if seed is not None:
+            for trainer, rng in zip(trainers, RandomStream(seed).spawn(len(trainers))):
+                trainer.rng = rng
+
+    def run(self, pop_size, generations, print_interval=10):
+        # Evolve every island for a specified number of generations, printing the progress of each island every
+        # print_interval generations
+        # Return the combined hall of fame, as a list of (genome, fitness, island) tuples, best first
+
+        # Spawn rather than fork the islands, so they don't inherit a Tk window or worker pool from this process
+        context = get_context("spawn")
+        num_islands = len(self.trainers)
+        inboxes = [context.Queue() for _ in range(num_islands)]
+        messages = context.Queue()
+
+        processes = []
+        for i, trainer in enumerate(self.trainers):
+            # Worker processes get copies of trainers without their cache (see RobbyTrainer.__getstate__), so each
+            # island makes a new one of the same size
+            cache_size = trainer.cache.max_size if trainer.cache is not None else 0
+            migration_interval = self.migration_interval if num_islands > 1 else 0
+            processes.append(context.Process(
+                target=_run_island,
+                args=(i, trainer, cache_size, pop_size, generations, migration_interval, self.migrants,
+                      self.hall_of_fame, inboxes[i], inboxes[(i + 1) % num_islands], messages)
+            ))
+
+        try:
+            for process in processes:
+                process.start()
+
+            # Print progress until every island has sent its hall of fame
+            halls = {}
+            while len(halls) < num_islands:
+                # An island that dies without reporting, killed by the OS for instance, would leave this waiting
+                # forever. Its messages are all sent by the time it exits, so if nothing arrives from any island after
+                # it has exited, it never finished
+                exited = [i for i, process in enumerate(processes) if process.exitcode is not None and i not in halls]
+                try:
+                    kind, island, payload = messages.get(timeout=POLL_INTERVAL)
+                except Empty:
+                    if exited:
+                        island = exited[0]
+                        raise RuntimeError(f"island {island} exited with code {processes[island].exitcode} "
+                                           f"without finishing")
+                    continue
+                if kind == "generation":
+                    generation, mean_fitness, max_fitness = payload
+                    if print_interval > 0 and generation % print_interval == 0:
+                        print(f"Island {island} generation {generation}/{generations}: "
+                              f"average fitness {round(mean_fitness, 2)}, best fitness {max_fitness}")
+                elif kind == "done":
+                    halls[island] = payload
+                else:
+                    raise RuntimeError(f"island {island} failed:\n{payload}")
+
+            for process in processes:
+                process.join()
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+        # Keep the best entry of each genome found by more than one island, breaking ties by island and then genome
+        # so that the order islands happened to finish in doesn't matter
+        entries = [(genome, fitness, island) for island, hall in halls.items() for fitness, genome in hall]
+        hall_of_fame = []
+        seen = set()
+        for genome, fitness, island in sorted(entries, key=lambda entry: (-entry[1], entry[2], entry[0])):
+            if genome not in seen:
+                seen.add(genome)
+                hall_of_fame.append((genome, fitness, island))
+        return hall_of_fame[:self.hall_of_fame]
+
+
+def _run_island(island, trainer, cache_size, pop_size, generations, migration_interval, migrants, hall_size,
+                inbox, outbox, messages):
+    from cache import FitnessCache
+
+    try:
+        if cache_size > 0:
+            trainer.cache = FitnessCache(cache_size)
+        log = TrainingLog(trainer.output_file) if trainer.output_file is not None else None
+
+        # Min-heap of the island's best (fitness, genome) pairs, and the genomes in it
+        hall = []
+        in_hall = set()
+
+        run = trainer.iter_train(pop_size, generations)
+        record = next(run, None)
+        while record is not None:
+            if log is not None:
+                log.write(record)
+            messages.put(("generation", island, (record.generation, record.mean_fitness, record.max_fitness)))
+
+            # The population is sorted, so stop at the first genome that can't make the hall of fame
+            sorted_genomes, fitness_vals = trainer.ranked
+            for row, fitness in zip(sorted_genomes[::-1], reversed(fitness_vals)):
+                if len(hall) == hall_size and fitness <= hall[0][0]:
+                    break
+                genome = row.tobytes()
+                if genome in in_hall:
+                    continue
+                in_hall.add(genome)
+                if len(hall) < hall_size:
+                    heapq.heappush(hall, (fitness, genome))
+                else:
+                    in_hall.discard(heapq.heappushpop(hall, (fitness, genome))[1])
+
+            # Swap migrants with the neighbouring islands, unless this was the last generation
+            immigrants = None
+            if migration_interval > 0 and (record.generation + 1) % migration_interval == 0 and \
+                    record.generation + 1 < generations:
+                outbox.put(trainer.top_genomes(migrants))
+                immigrants = inbox.get()
+            record = _send(run, immigrants)
+
+        if log is not None:
+            log.close()
+        trainer.close()
+        messages.put(("done", island, sorted(hall, reverse=True)))
+    except Exception:
+        messages.put(("error", island, traceback.format_exc()))
+
+
+def _send(run, migrants):
+    # Return the next record of a training run, passing it any migrants, or None once it is over
+    try:
+        return run.send(migrants)
+    except StopIteration:
+        return None
@@ -1,5 +1,6 @@
 import crossover
 import fitness
+import genome
 import robby
 import selection
 from robby_trainer import RobbyTrainer
@@ -10,13 +11,15 @@ if __name__ == '__main__':
 
     rt = RobbyTrainer(
         world=world,
-        output_file="robby.txt",
+        output_file="robby.log",
         mutation_rate=0.005,
         crossover_func=crossover.KPointCrossover(crossover_rate=1, num_points=2),
         selection_func=selection.RankedChoiceSelection(),
         reward_func=fitness.RewardCanCollecting(),
         can_fill_rate=0.25,
-        steps=200
+        steps=200,
+        batched=True,
+        async_demos=True
     )
 
     # Train the population for the specified number of generations
@@ -33,7 +36,7 @@ if __name__ == '__main__':
     ) / 20
 
     print("Best fitness value: ", best[1])
-    print("Best genome: ", best[0])
+    print("Best genome: ", genome.to_string(best[0]))
     print("Average fitness of hardcoded genome: ", hc)
 
-    world.demo(best[0], steps=400, init=0.25)
+    world.demo(genome.to_string(best[0]), steps=400, init=0.25)
@@ -0,0 +1,94 @@
+from bisect import insort
+
+import numpy as np
+
+from genome import GENOME_LENGTH
+
+
+class SortedPopulation:
+    # A population for steady-state training, in which a batch of the worst genomes is replaced at every step
+    #
+    # Genomes live in fixed slots, and a child takes over the slot of a genome it replaces. The slots are kept in
+    # ascending order of fitness in a list of (fitness, insertion number, slot) entries, with each new entry put in
+    # place by binary search, so that a genome that ties with others ranks above them. A Fenwick tree over the
+    # fitness value of each slot gives the sum of any prefix of slots in O(log n), which is enough to draw a genome
+    # with probability proportional to its fitness plus an offset without rebuilding any cumulative weights
+
+    def __init__(self, sorted_genomes, fitness_vals):
+        # Start from a population matrix and its list of fitness values, both in ascending order of fitness
+
+        self.genomes = [g.tobytes() for g in sorted_genomes]
+        self.fitness_vals = [float(v) for v in fitness_vals]
+        self.values = list(fitness_vals)
+        self.order = [(v, i, i) for i, v in enumerate(self.fitness_vals)]
+        self.insertions = len(self.order)
+
+        # Fenwick tree over the slots' fitness values, 1-based, built in O(n)
+        self.tree = [0.0] + self.fitness_vals
+        for i in range(1, len(self.tree)):
+            parent = i + (i & -i)
+            if parent < len(self.tree):
+                self.tree[parent] += self.tree[i]
+        self.top_step = 1 << (len(self.genomes).bit_length() - 1) if self.genomes else 0
+
+    def __len__(self):
+        return len(self.genomes)
+
+    def slot_at(self, rank):
+        # Return the slot of the genome with the given rank, 0 being the worst
+        return self.order[rank][2]
+
+    def min_fitness(self):
+        return self.order[0][0]
+
+    def total_fitness(self):
+        # Return the sum of all fitness values
+        total = 0.0
+        i = len(self.genomes)
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def find_weighted(self, target, offset):
+        # Return the first slot at which the running sum of fitness + offset over the slots exceeds target, so that a
+        # target drawn uniformly from [0, total) picks each slot with probability proportional to its weight
+
+        slot = 0
+        step = self.top_step
+        while step:
+            node = slot + step
+            if node <= len(self.genomes):
+                weight = self.tree[node] + offset * step
+                if weight <= target:
+                    slot = node
+                    target -= weight
+            step >>= 1
+        return min(slot, len(self.genomes) - 1)
+
+    def replace_worst(self, new_genomes, new_fitness_vals):
+        # Replace as many of the worst genomes as there are new ones with them
+
+        count = len(new_genomes)
+        freed = [slot for _, _, slot in self.order[:count]]
+        del self.order[:count]
+        for slot, genome, fitness in zip(freed, new_genomes, new_fitness_vals):
+            self._add(slot, float(fitness) - self.fitness_vals[slot])
+            self.genomes[slot] = bytes(genome)
+            self.fitness_vals[slot] = float(fitness)
+            self.values[slot] = fitness
+            insort(self.order, (float(fitness), self.insertions, slot))
+            self.insertions += 1
+
+    def _add(self, slot, delta):
+        i = slot + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def sorted(self):
+        # Return the population as a matrix and its list of fitness values, both in ascending order of fitness
+
+        slots = [slot for _, _, slot in self.order]
+        genomes = np.frombuffer(b"".join([self.genomes[slot] for slot in slots]), dtype=np.uint8)
+        return genomes.reshape(len(slots), GENOME_LENGTH).copy(), [self.values[slot] for slot in slots]
@@ -0,0 +1,91 @@
+import cProfile
+import pstats
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+
+
+class PhaseProfiler:
+    # Accumulates wall time and call counts for each phase of training (evaluate, selection, crossover, mutation,
+    # checkpoint, logging and demo), along with the number of evaluations and simulation steps run
+    #
+    # Hooks added with add_hook() are called as hook(profiler, generation) at the end of every generation. For a
+    # closer look, a window of generations [start, stop) can be run under cProfile (leaving the results in
+    # self.stats) and/or tracemalloc (leaving a snapshot of allocations in self.snapshot)
+    #
+    # A trainer without a profiler only pays for a check of self.profiler per phase, so it costs nothing to leave
+    # the instrumentation in
+
+    def __init__(self, cprofile_window=None, tracemalloc_window=None):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.evaluations = 0
+        self.steps = 0
+        self.hooks = []
+
+        self.cprofile_window = cprofile_window
+        self.tracemalloc_window = tracemalloc_window
+        self.cprofile = None
+        self.stats = None
+        self.snapshot = None
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    @contextmanager
+    def phase(self, name):
+        # Time the body of a with statement as a call of the named phase
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += perf_counter() - start
+            self.calls[name] += 1
+
+    def count_evaluations(self, evaluations, steps):
+        # Record that genomes were run in evaluations worlds for steps steps each
+        self.evaluations += evaluations
+        self.steps += evaluations * steps
+
+    def start_generation(self, generation):
+        # Start any capture whose window begins at this generation
+
+        if self.cprofile_window is not None and generation == self.cprofile_window[0]:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        if self.tracemalloc_window is not None and generation == self.tracemalloc_window[0]:
+            tracemalloc.start()
+
+    def end_generation(self, generation):
+        # Stop any capture whose window ends after this generation, then call the hooks
+
+        if self.cprofile is not None and generation == self.cprofile_window[1] - 1:
+            self.cprofile.disable()
+            self.stats = pstats.Stats(self.cprofile)
+            self.cprofile = None
+        if self.tracemalloc_window is not None and generation == self.tracemalloc_window[1] - 1:
+            self.snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+        for hook in self.hooks:
+            hook(self, generation)
+
+    def evaluations_per_second(self):
+        seconds = self.seconds["evaluate"]
+        return self.evaluations / seconds if seconds else 0.0
+
+    def steps_per_second(self):
+        seconds = self.seconds["evaluate"]
+        return self.steps / seconds if seconds else 0.0
+
+    def report(self):
+        # Return a table of the time spent in each phase, slowest first, and the evaluation throughput
+
+        total = sum(self.seconds.values())
+        lines = [f"{'phase':<12}{'seconds':>10}{'calls':>8}{'share':>8}"]
+        for name in sorted(self.seconds, key=self.seconds.get, reverse=True):
+            share = self.seconds[name] / total if total else 0.0
+            lines.append(f"{name:<12}{self.seconds[name]:>10.3f}{self.calls[name]:>8}{share:>8.1%}")
+        lines.append(f"{self.evaluations_per_second():,.0f} evaluations/s, {self.steps_per_second():,.0f} steps/s")
+        return "\n".join(lines)
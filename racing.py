@@ -0,0 +1,68 @@
+import numpy as np
+
+
+class FitnessRace:
+    # Adaptive fitness evaluation that spends extra trials only where they change the ranking
+    #
+    # Every genome is first run in initial_trials random worlds. Then, in rounds, each genome whose confidence
+    # interval (its mean reward plus or minus z standard errors) still straddles a ranking boundary is run in
+    # batch_trials more worlds, until no interval straddles a boundary or the genomes on them have had max_trials
+    # trials. The boundaries are between the champion and the runner-up, and between the top_k genomes and the rest,
+    # so the elite is ranked about as reliably as with max_trials trials for everyone, while clearly worse genomes
+    # are only run initial_trials times
+    #
+    # A genome's variance is estimated from its own trials, shrunk towards the variance pooled over the population
+    # with the weight of prior_trials trials, so that a genome that happened to score the same in its first few
+    # worlds doesn't look certain
+
+    def __init__(self, initial_trials=3, max_trials=20, batch_trials=2, top_k=10, z=2.0, prior_trials=2):
+        assert 1 < initial_trials <= max_trials and batch_trials > 0
+        self.initial_trials = initial_trials
+        self.max_trials = max_trials
+        self.batch_trials = batch_trials
+        self.top_k = top_k
+        self.z = z
+        self.prior_trials = prior_trials
+
+        # Number of trials each genome got in the last race
+        self.trials = None
+
+    def __call__(self, pop_size, run_trials):
+        # Return the list of mean rewards of a population of pop_size genomes, where run_trials(indices) returns the
+        # reward of a run of genome indices[i] in a fresh random world for every i (indices may repeat)
+
+        counts = np.zeros(pop_size, dtype=np.int64)
+        sums = np.zeros(pop_size)
+        squares = np.zeros(pop_size)
+
+        indices = np.repeat(np.arange(pop_size), self.initial_trials)
+        while len(indices):
+            rewards = np.asarray(run_trials(indices), dtype=np.float64)
+            counts += np.bincount(indices, minlength=pop_size)
+            sums += np.bincount(indices, rewards, minlength=pop_size)
+            squares += np.bincount(indices, rewards * rewards, minlength=pop_size)
+
+            contested = self.contested(counts, sums, squares) & (counts < self.max_trials)
+            extra = np.minimum(self.batch_trials, self.max_trials - counts[contested])
+            indices = np.repeat(np.flatnonzero(contested), extra)
+
+        self.trials = counts
+        return (sums / counts).tolist()
+
+    def contested(self, counts, sums, squares):
+        # Return a boolean array marking the genomes whose confidence interval contains a ranking boundary
+
+        means = sums / counts
+        deviations = np.maximum(squares - sums * means, 0.0)
+        pooled_variance = deviations.sum() / (counts - 1).sum()
+        variances = (deviations + self.prior_trials * pooled_variance) / (counts - 1 + self.prior_trials)
+        margins = self.z * np.sqrt(variances / counts)
+
+        # A boundary below rank r lies halfway between the means of the genomes ranked r and r + 1
+        ranked = np.sort(means)[::-1]
+        contested = np.zeros(len(means), dtype=bool)
+        for r in (1, self.top_k):
+            if 0 < r < len(means):
+                boundary = (ranked[r - 1] + ranked[r]) / 2
+                contested |= np.abs(means - boundary) <= margins
+        return contested
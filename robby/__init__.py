@@ -11,6 +11,7 @@ by Melanie Mitchell, Oxford University Press, 2009.
 Commands
 --------
 rw = World(10, 10)
+rw = World(10, 10, rng=RandomStream(seed))
 
 rw.getCurrentPosition()
 rw.getPercept()
@@ -30,65 +31,90 @@ rw.look() -- same as getPercept
 
 rw.graphicsOff(message="")
 rw.graphicsOn()
+rw.close()
 rw.demo(strategy, steps=200, init=0.50)
 
 rw.load(filename)
 rw.save(filename)
 
-"""
+The simulation itself lives in robby.headless.HeadlessWorld, which has
+no graphics dependencies and can be used directly for training. World
+is a Tk view layered on top of a HeadlessWorld model.
+
+The graphics module (and with it tkinter) is only imported when a
+World's window is first needed, by demo() or graphicsOn(), so creating
+a World or training with one works without a display. Names from the
+graphics module can still be used as robby.<name>, which imports it.
 
-from robby.graphics import *
-import random, time, os
+"""
 
-POSSIBLE_ACTIONS = ["MoveNorth", "MoveSouth", "MoveEast", "MoveWest", "StayPut", "PickUpCan", "MoveRandom"]
+from robby.headless import HeadlessWorld, POSSIBLE_ACTIONS, ACTION_CODES
+import importlib, time, os
 
 # parameters for demo method
 PAUSE = 0.08
 CYCLE_LIMIT = 3
 FAST_STEPS = 100  # number of steps to run at high speed after detecting a cycle
 
+ICON_DIR = "robby" + os.sep
+
+# offsets in cells of the "ow" icons drawn outside the grid next to a wall crash
+OW_OFFSETS = {"ow_n": (0, -1), "ow_s": (0, 1), "ow_e": (1, 0), "ow_w": (-1, 0)}
+
+# tk images of the icons, each decoded from its GIF file once and shared by every cell of every world
+_iconImages = {}
+
+def _iconImage(name):
+    if name not in _iconImages:
+        from robby.graphics import Image, Point
+        _iconImages[name] = Image(Point(0, 0), ICON_DIR + name + ".gif").img
+    return _iconImages[name]
+
+# import the graphics module on first use of one of its names
+def __getattr__(name):
+    if name.startswith("_"):
+        raise AttributeError("module 'robby' has no attribute '%s'" % name)
+    graphics = importlib.import_module("robby.graphics")
+    try:
+        return getattr(graphics, name)
+    except AttributeError:
+        raise AttributeError("module 'robby' has no attribute '%s'" % name) from None
+
 class GridCell:
     def __init__(self, world, row, col):
         self.world = world
         self.row = row
         self.col = col
         # center of grid cell
-        x = (col+1)*world.cellw + world.cellw/2
-        y = (row+1)*world.cellh + world.cellh/2
+        self.x = (col+1)*world.cellw + world.cellw/2
+        self.y = (row+1)*world.cellh + world.cellh/2
+        # icons are created the first time they are drawn
         self.icons = {}
-        iconNames = ["coke_can", "robby", "robby_can"]
-        if row == world.topRow:
-            iconNames.extend(["crash_n", "crash_can_n"])
-        if row == world.bottomRow:
-            iconNames.extend(["crash_s", "crash_can_s"])
-        if col == world.leftCol:
-            iconNames.extend(["crash_w", "crash_can_w"])
-        if col == world.rightCol:
-            iconNames.extend(["crash_e", "crash_can_e"])
-        dirname = "robby" + os.sep
-        for name in iconNames:
-            self.icons[name] = Image(Point(x, y), dirname+name+".gif")
-        if row == world.topRow:
-            self.icons["ow_n"] = Image(Point(x, y-world.cellh), dirname+"ow_n.gif")
-        if row == world.bottomRow:
-            self.icons["ow_s"] = Image(Point(x, y+world.cellh), dirname+"ow_s.gif")
-        if col == world.leftCol:
-            self.icons["ow_w"] = Image(Point(x-world.cellw, y), dirname+"ow_w.gif")
-        if col == world.rightCol:
-            self.icons["ow_e"] = Image(Point(x+world.cellw, y), dirname+"ow_e.gif")
-        self.contents = "E"
         self.icon = None
         self.owIcon = None
         if self.robbyIsHere():
-            self.icon = self.icons["robby"]
-            self.icon.draw(world)
+            self.icon = self.getIcon("robby")
+            self.icon.draw(world.window)
+
+    # returns this cell's copy of an icon, sharing the world-wide tk image
+    def getIcon(self, name):
+        if name not in self.icons:
+            from robby.graphics import Image, Point
+            dx, dy = OW_OFFSETS.get(name, (0, 0))
+            anchor = Point(self.x + dx*self.world.cellw, self.y + dy*self.world.cellh)
+            self.icons[name] = Image(anchor, _iconImage(name))
+        return self.icons[name]
+
+    # the cell contents are owned by the world's headless model
+    @property
+    def contents(self):
+        return self.world.model.getContents(self.row, self.col)
 
     def robbyIsHere(self):
         return self.row == self.world.robbyRow and self.col == self.world.robbyCol
 
     def setContents(self, newContents):
-        assert newContents in ["E", "C"]
-        self.contents = newContents
+        self.world.model.setContents(self.row, self.col, newContents)
         self.updateGraphics()
 
     def clearOwIcon(self):
@@ -101,12 +127,12 @@ class GridCell:
             return
         self.clearOwIcon()
         if self.robbyIsHere():
-            newIcon = self.icons["robby_can" if self.contents == "C" else "robby"]
+            newIcon = self.getIcon("robby_can" if self.contents == "C" else "robby")
         else:
-            newIcon = self.icons["coke_can"] if self.contents == "C" else None
+            newIcon = self.getIcon("coke_can") if self.contents == "C" else None
         if newIcon is not self.icon:
             if newIcon is not None:
-                newIcon.draw(self.world)
+                newIcon.draw(self.world.window)
             if self.icon is not None:
                 self.icon.undraw()
             self.icon = newIcon
@@ -116,8 +142,8 @@ class GridCell:
             return
         self.clearOwIcon()
         if self.contents == "C":
-            newIcon = self.icons["coke_can"]
-            newIcon.draw(self.world)
+            newIcon = self.getIcon("coke_can")
+            newIcon.draw(self.world.window)
             self.icon.undraw()
             self.icon = newIcon
         else:
@@ -138,32 +164,47 @@ class GridCell:
         else:
             raise Exception("bad crash action: %s" % action)
         crashIconName = "crash_can" if self.contents == "C" else "crash"
-        crashIcon = self.icons[crashIconName + direction]
-        owIcon = self.icons["ow" + direction]
+        crashIcon = self.getIcon(crashIconName + direction)
+        owIcon = self.getIcon("ow" + direction)
         if self.icon is not None:
             self.icon.undraw()
         if self.owIcon is not None:
             self.owIcon.undraw()
-        crashIcon.draw(self.world)
-        owIcon.draw(self.world)
+        crashIcon.draw(self.world.window)
+        owIcon.draw(self.world.window)
         self.icon = crashIcon
         self.owIcon = owIcon
 
 
-class World(GraphWin):
+class World:
 
     # Melanie Mitchell's hand-coded strategy
     strategyM = "656353656252353252656353656151353151252353252151353151656353656252353252656353656050353050252353252050353050151353151252353252151353151050353050252353252050353050656353656252353252656353656151353151252353252151353151656353656252353252656353454"
 
-    def __init__(self, numRows, numCols):
-        # create the grid
+    def __init__(self, numRows, numCols, rng=None):
+        # the model holds the grid contents and robby's position, and draws random numbers from rng
+        # (a RandomStream or random.Random), or the random module if not given one
+        self.model = HeadlessWorld(numRows, numCols, rng)
+        self.numRows = numRows
+        self.numCols = numCols
+        self.topRow = 0
+        self.bottomRow = numRows-1
+        self.leftCol = 0
+        self.rightCol = numCols-1
+        # the window and grid cells are created by the first call to graphicsOn
+        self.window = None
+        self.grid = None
+        self.graphicsEnabled = False
+
+    # create the window and draw the grid
+    def _openWindow(self):
+        from robby.graphics import GraphWin, Line, Point, Rectangle, Text
         iconSize = 40
         spacing = 3
-        windowWidth = (iconSize + 2*spacing) * (numCols + 2)
-        windowHeight = (iconSize + 2*spacing) * (numRows + 2)
-        GraphWin.__init__(self, "Robby the Robot", windowWidth, windowHeight)
-        self.setBackground("white")
-        self.graphicsEnabled = True
+        windowWidth = (iconSize + 2*spacing) * (self.numCols + 2)
+        windowHeight = (iconSize + 2*spacing) * (self.numRows + 2)
+        self.window = GraphWin("Robby the Robot", windowWidth, windowHeight)
+        self.window.setBackground("white")
         self.blank = Rectangle(Point(0,0), Point(windowWidth,windowHeight))
         self.blank.setFill("gray")
         self.blank.setOutline("gray")
@@ -173,48 +214,64 @@ class World(GraphWin):
         self.cellw = iconSize + 2*spacing
         self.cellh = iconSize + 2*spacing
         x1, y1 = self.cellw, self.cellh
-        x2, y2 = self.cellw*(numCols+1), self.cellh*(numRows+1)
+        x2, y2 = self.cellw*(self.numCols+1), self.cellh*(self.numRows+1)
         x, y = x1, y1
-        for r in range(numRows+1):
-            Line(Point(x1, y), Point(x2, y)).draw(self)
-            Line(Point(x, y1), Point(x, y2)).draw(self)
+        for r in range(self.numRows+1):
+            Line(Point(x1, y), Point(x2, y)).draw(self.window)
+            Line(Point(x, y1), Point(x, y2)).draw(self.window)
             x += self.cellw
             y += self.cellh
-        self.numRows = numRows
-        self.numCols = numCols
-        self.topRow = 0
-        self.bottomRow = numRows-1
-        self.leftCol = 0
-        self.rightCol = numCols-1
-        # current position of robby
-        self.robbyRow = 0
-        self.robbyCol = 0
         # create the cells
-        self.grid = [[GridCell(self,r,c) for c in range(numCols)] for r in range(numRows)]
-        
+        self.grid = [[GridCell(self,r,c) for c in range(self.numCols)] for r in range(self.numRows)]
+
+    def close(self):
+        if self.window is not None:
+            self.window.close()
+            self.window = None
+            self.grid = None
+            self.graphicsEnabled = False
+
+    # current position of robby
+    @property
+    def robbyRow(self):
+        return self.model.robbyRow
+
+    @property
+    def robbyCol(self):
+        return self.model.robbyCol
+
+    @property
+    def perceptCode(self):
+        return self.model.perceptCode
+
     def graphicsOff(self, message=""):
         if self.graphicsEnabled:
-            self.blank.draw(self)
+            self.blank.draw(self.window)
             self.text.setText(message)
-            self.text.draw(self)
+            self.text.draw(self.window)
             self.graphicsEnabled = False
 
     def graphicsOn(self):
-        if not self.graphicsEnabled:
+        if self.window is None:
+            self._openWindow()
+            self.graphicsEnabled = True
+            self._updateGrid()
+        elif not self.graphicsEnabled:
             self.text.undraw()
             self.blank.undraw()
             self.graphicsEnabled = True
             self._updateGrid()
 
     def _updateGrid(self):
+        if not self.graphicsEnabled:
+            return
         for r in range(self.numRows):
             for c in range(self.numCols):
                 self.grid[r][c].updateGraphics()
 
     def distributeCans(self, density=0.50):
-        for r in range(self.numRows):
-            for c in range(self.numCols):
-                self.grid[r][c].setContents("C" if random.uniform(0, 1) < density else "E")
+        self.model.distributeCans(density)
+        self._updateGrid()
 
     def demo(self, strategy, steps=200, init=0.50):
         if type(strategy) is not str or len(strategy) != 243:
@@ -289,50 +346,31 @@ class World(GraphWin):
         return True
 
     def _gridContents(self):
-        return "".join([self.grid[r][c].contents for r in range(self.numRows) for c in range(self.numCols)])
+        return self.model._gridContents()
 
     def performAction(self, action):
-        if action not in POSSIBLE_ACTIONS:
+        if action not in ACTION_CODES:
             print("ERROR -- possible actions are:\n%s" % POSSIBLE_ACTIONS)
             return
-        if action == "MoveNorth" and self.robbyRow == self.topRow or \
-                action == "MoveSouth" and self.robbyRow == self.bottomRow or \
-                action == "MoveEast" and self.robbyCol == self.rightCol or \
-                action == "MoveWest" and self.robbyCol == self.leftCol:
-            self.grid[self.robbyRow][self.robbyCol].crashIntoWall(action)
-            return -5
-        elif action == "MoveNorth":
-            self.grid[self.robbyRow][self.robbyCol].undrawRobby()
-            self.robbyRow -= 1
-            self.grid[self.robbyRow][self.robbyCol].updateGraphics()
-            return 0
-        elif action == "MoveSouth":
-            self.grid[self.robbyRow][self.robbyCol].undrawRobby()
-            self.robbyRow += 1
-            self.grid[self.robbyRow][self.robbyCol].updateGraphics()
-            return 0
-        elif action == "MoveEast":
-            self.grid[self.robbyRow][self.robbyCol].undrawRobby()
-            self.robbyCol += 1
-            self.grid[self.robbyRow][self.robbyCol].updateGraphics()
-            return 0
-        elif action == "MoveWest":
-            self.grid[self.robbyRow][self.robbyCol].undrawRobby()
-            self.robbyCol -= 1
-            self.grid[self.robbyRow][self.robbyCol].updateGraphics()
-            return 0
-        elif action == "MoveRandom":
-            return self.performAction(random.choice(["MoveNorth", "MoveSouth", "MoveEast", "MoveWest"]))
-        elif action == "StayPut":
-            self.grid[self.robbyRow][self.robbyCol].updateGraphics()
-            return 0
-        elif action == "PickUpCan":
-            reward = +10 if self.grid[self.robbyRow][self.robbyCol].contents == "C" else -1
-            self.grid[self.robbyRow][self.robbyCol].setContents("E")
+        # the view works with action names, so that crashes can be drawn facing the right way
+        action = POSSIBLE_ACTIONS[ACTION_CODES[action]]
+        if action == "MoveRandom":
+            # pick the direction here so that a crash can be drawn facing the right way
+            return self.performAction(self.model.rng.choice(["MoveNorth", "MoveSouth", "MoveEast", "MoveWest"]))
+        row, col = self.robbyRow, self.robbyCol
+        reward = self.model.performAction(action)
+        if not self.graphicsEnabled:
+            # the cells are redrawn when graphics are turned back on
             return reward
+        if (row, col) != (self.robbyRow, self.robbyCol):
+            self.grid[row][col].undrawRobby()
+            self.grid[self.robbyRow][self.robbyCol].updateGraphics()
+        elif action in ["MoveNorth", "MoveSouth", "MoveEast", "MoveWest"]:
+            # a move that leaves robby in place means he ran into a wall
+            self.grid[row][col].crashIntoWall(action)
         else:
-            # should never happen
-            raise Exception("bad action: %s" % action)
+            self.grid[row][col].updateGraphics()
+        return reward
             
     # abbreviations
     def north(self):
@@ -353,60 +391,31 @@ class World(GraphWin):
         return self.getPercept()
 
     def getPercept(self):
-        s = ""
-        s += "W" if self.robbyRow == self.topRow else self.grid[self.robbyRow-1][self.robbyCol].contents
-        s += "W" if self.robbyRow == self.bottomRow else self.grid[self.robbyRow+1][self.robbyCol].contents
-        s += "W" if self.robbyCol == self.rightCol else self.grid[self.robbyRow][self.robbyCol+1].contents
-        s += "W" if self.robbyCol == self.leftCol else self.grid[self.robbyRow][self.robbyCol-1].contents
-        s += self.grid[self.robbyRow][self.robbyCol].contents
-        return s
+        return self.model.getPercept()
 
     # returns the code number of the current percept (example: returns 19 for "EEWEC")
     def getPerceptCode(self):
-        percept = self.getPercept()
-        return int(percept.replace("E", "0").replace("C", "1").replace("W", "2"), 3)
+        return self.model.getPerceptCode()
 
     def getCurrentPosition(self):
-        return self.robbyRow, self.robbyCol
+        return self.model.getCurrentPosition()
 
     def goto(self, newRow, newCol):
         assert 0 <= newRow < self.numRows and 0 <= newCol < self.numCols
+        if not self.graphicsEnabled:
+            self.model.goto(newRow, newCol)
+            return
         self.grid[self.robbyRow][self.robbyCol].undrawRobby()
-        self.robbyRow = newRow
-        self.robbyCol = newCol
+        self.model.goto(newRow, newCol)
         self.grid[self.robbyRow][self.robbyCol].updateGraphics()
 
     def show(self):
-        s = ""
-        for r in range(self.numRows):
-            for c in range(self.numCols):
-                if r == self.robbyRow and c == self.robbyCol:
-                    s += "CR " if self.grid[r][c].contents == "C" else "R  "
-                else:
-                    s += "C  " if self.grid[r][c].contents == "C" else ".  "
-            s += "\n"
-        print(s.strip())
+        self.model.show()
 
     def load(self, configFilename):
-        f = open(configFilename)
-        lines = [line.strip() for line in f]
-        f.close()
-        if len(lines) != self.numRows + 2 or len(lines[0]) != self.numCols:
-            print("ERROR -- invalid grid format in file %s" % configFilename)
-            return
-        self.goto(int(lines[-2]), int(lines[-1]))
-        for r in range(self.numRows):
-            for c in range(self.numCols):
-                self.grid[r][c].setContents("E" if lines[r][c] == "." else "C")
+        if self.model.load(configFilename):
+            self._updateGrid()
 
     def save(self, configFilename):
-        f = open(configFilename, "w")
-        for r in range(self.numRows):
-            for c in range(self.numCols):
-                f.write("." if self.grid[r][c].contents == "E" else "C")
-            f.write("\n")
-        f.write("%d\n" % self.robbyRow)
-        f.write("%d\n" % self.robbyCol)
-        f.close()
-        print("Configuration saved in file %s" % configFilename)
+        self.model.save(configFilename)
 
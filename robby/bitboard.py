@@ -0,0 +1,145 @@
+"""
+Bitboard Robby the Robot world
+
+A headless world for large grids (up to 256x256 and beyond) that keeps
+the cans in a single Python int, with bit row*numCols + col set
+wherever there is a can. A world is then just a handful of integers
+rather than one object or byte per cell: percepts, pickups and whole
+grid hashing are bit operations on that int. With a RandomStream,
+distributeCans draws the same values as a HeadlessWorld, so a seed gives
+the same layout in either; otherwise it draws a few random integers
+covering the whole grid instead of one random number per cell.
+
+BitboardWorld accepts the same calls as HeadlessWorld (and so can be
+used anywhere a HeadlessWorld can, including by the trainer), but has
+no per-position lookup tables, so creating one costs the same for any
+grid size. Code that writes to the cans int directly must call
+updatePercept() afterwards.
+
+Commands
+--------
+bw = BitboardWorld(256, 256)
+
+bw.distributeCans(density=0.25)
+bw.getPerceptCode()
+bw.performAction(action)
+bw.getState()
+
+"""
+
+from robby.headless import HeadlessWorld, EMPTY, CAN, WALL, CELL_CHARS
+
+# number of binary digits of the can density used by distributeCans
+DENSITY_BITS = 32
+
+# translation from cell states to binary digits, for building the cans int from a sequence of states
+_STATES_TO_DIGITS = bytes.maketrans(bytes([EMPTY, CAN]), b"01")
+
+# weight in the percept code of the cell in the direction of each move action code
+_MOVE_WEIGHTS = (81, 27, 9, 3)
+
+
+class BitboardWorld(HeadlessWorld):
+
+    def __init__(self, numRows, numCols, rng=None):
+        self._initWorld(numRows, numCols, rng)
+        # bit row*numCols + col is set wherever there is a can
+        self.cans = 0
+        # mask covering the cells from north of robby to south of him, once shifted down to the north cell
+        self._windowMask = (1 << (2*numCols + 1)) - 1
+        # change in position for each move action code
+        self._moveSteps = [-numCols, numCols, 1, -1]
+        self.updatePercept()
+
+    def getCell(self, row, col):
+        return self.cans >> (row*self.numCols + col) & 1
+
+    def setCell(self, row, col, state):
+        assert state in (EMPTY, CAN)
+        bit = 1 << (row*self.numCols + col)
+        self.cans = self.cans | bit if state == CAN else self.cans & ~bit
+        self.updatePercept()
+
+    def getContents(self, row, col):
+        return CELL_CHARS[self.getCell(row, col)]
+
+    def setContents(self, row, col, newContents):
+        assert newContents in ["E", "C"]
+        self.setCell(row, col, CAN if newContents == "C" else EMPTY)
+
+    def setCells(self, states):
+        # bit 0 is the first cell, so the digits are reversed to put it last
+        self.cans = int(bytes(states).translate(_STATES_TO_DIGITS)[::-1], 2)
+        self.updatePercept()
+
+    def distributeCans(self, density=0.50):
+        # Each bit of x | r (or x & r) for a random int r is set with probability (p + 1) / 2 (or p / 2), where p
+        # is the probability for x. Starting from no cans and working from the last binary digit of the density
+        # to the first, OR-ing in random bits for a 1 and AND-ing them for a 0, sets each bit with probability
+        # equal to the density, to DENSITY_BITS binary digits. Trailing zero digits draw nothing, so a density
+        # of 0.25 (0.01 in binary) takes just two draws
+        numCells = self.numRows * self.numCols
+        if hasattr(self.rng, "bernoulli"):
+            # a RandomStream draws the whole grid at once, exactly as for a HeadlessWorld, so that a seed gives
+            # the same layout in either kind of world (and in the batch evaluator)
+            self.setCells(self.rng.bernoulli(numCells, density))
+            return
+        if density >= 1:
+            self.cans = (1 << numCells) - 1
+        else:
+            digits = int(max(density, 0) * 2**DENSITY_BITS)
+            cans = 0
+            for _ in range(DENSITY_BITS):
+                if digits & 1:
+                    cans |= self.rng.getrandbits(numCells)
+                elif cans:
+                    cans &= self.rng.getrandbits(numCells)
+                digits >>= 1
+            self.cans = cans
+        self.updatePercept()
+
+    def _gridContents(self):
+        numCells = self.numRows * self.numCols
+        return format(self.cans, "0%db" % numCells)[::-1].translate(str.maketrans("01", "EC"))
+
+    def _move(self, code):
+        # the percept code already says whether there is a wall in the direction of the move
+        if self.perceptCode // _MOVE_WEIGHTS[code] % 3 == WALL:
+            return -5
+        self.robbyPos += self._moveSteps[code]
+        self.updatePercept()
+        return 0
+
+    def _pickUp(self):
+        bit = 1 << self.robbyPos
+        if self.cans & bit:
+            # only the "here" digit of the percept changes
+            self.cans ^= bit
+            self.perceptCode -= CAN
+            return +10
+        return -1
+
+    def _perceptStates(self):
+        # cell states north, south, east, west and here, with WALL for cells off the grid
+        # shifting the whole grid is the expensive part, so it is done once to get the few rows around robby
+        numCols = self.numCols
+        i = self.robbyPos
+        start = i - numCols
+        if start < 0:
+            window = (self.cans & self._windowMask >> -start) << -start
+        else:
+            window = self.cans >> start & self._windowMask
+        row, col = divmod(i, numCols)
+        n = WALL if row == self.topRow else window & 1
+        s = WALL if row == self.bottomRow else window >> 2*numCols & 1
+        e = WALL if col == self.rightCol else window >> numCols + 1 & 1
+        w = WALL if col == self.leftCol else window >> numCols - 1 & 1
+        return n, s, e, w, window >> numCols & 1
+
+    # recompute the percept code from the cells around robby's current position
+    def updatePercept(self):
+        n, s, e, w, h = self._perceptStates()
+        self.perceptCode = n*81 + s*27 + e*9 + w*3 + h
+
+    def getState(self):
+        return self.robbyRow, self.robbyCol, self.cans
@@ -817,7 +817,9 @@ class Image(GraphicsObject):
         self.anchor = p.clone()
         self.imageId = Image.idCount
         Image.idCount = Image.idCount + 1
-        if len(pixmap) == 1: # file name provided
+        if len(pixmap) == 1 and isinstance(pixmap[0], tk.PhotoImage): # shared image provided
+            self.img = pixmap[0]
+        elif len(pixmap) == 1: # file name provided
             self.img = tk.PhotoImage(file=pixmap[0], master=_root)
         else: # width and height provided
             width, height = pixmap
@@ -0,0 +1,284 @@
+"""
+Headless Robby the Robot world
+
+A pure model of Robby's world with no graphics dependencies, suitable
+for training on machines without a display. The grid is stored as a
+flat bytearray of integer cell states, indexed by row*numCols + col.
+The Tk World class in robby/__init__.py is a view layered on top of
+this model and delegates all of the simulation to it.
+
+The current percept code is kept in the perceptCode attribute, and is
+updated from the five cells around Robby whenever he moves or the grid
+changes, so reading it costs nothing. Code that writes to the cells
+array directly must call updatePercept() afterwards.
+
+Actions can be given either by name or by action code (the index of
+the name in POSSIBLE_ACTIONS, as stored in genomes). Codes are the fast
+path: robby's position is kept as a flat cell index, and moves are
+looked up in precomputed per-position tables.
+
+Commands
+--------
+hw = HeadlessWorld(10, 10)
+hw = HeadlessWorld(10, 10, rng=RandomStream(seed))
+
+hw.getCurrentPosition()
+hw.getPercept()
+hw.getPerceptCode()
+hw.distributeCans(density=0.50)
+hw.goto(row, col)
+hw.performAction(action)  -- action name or code, e.g. "PickUpCan" or PICK_UP_CAN
+hw.seed(a)
+hw.getState()
+
+hw.load(filename)
+hw.save(filename)
+
+"""
+
+import random
+
+POSSIBLE_ACTIONS = ["MoveNorth", "MoveSouth", "MoveEast", "MoveWest", "StayPut", "PickUpCan", "MoveRandom"]
+
+# action codes, the indices of the actions in POSSIBLE_ACTIONS
+MOVE_NORTH, MOVE_SOUTH, MOVE_EAST, MOVE_WEST, STAY_PUT, PICK_UP_CAN, MOVE_RANDOM = range(len(POSSIBLE_ACTIONS))
+
+# the action code of every action, looked up by either its name or its code
+ACTION_CODES = {action: code for code, action in enumerate(POSSIBLE_ACTIONS)}
+ACTION_CODES.update({code: code for code in range(len(POSSIBLE_ACTIONS))})
+
+# cell states, chosen to match the digits used in percept codes
+EMPTY = 0
+CAN = 1
+WALL = 2
+
+# characters used for each cell state in percepts and saved configurations
+CELL_CHARS = "ECW"
+
+
+class HeadlessWorld:
+
+    def __init__(self, numRows, numCols, rng=None):
+        self._initWorld(numRows, numCols, rng)
+        # one integer cell state (EMPTY or CAN) per grid cell
+        self.cells = bytearray(numRows * numCols)
+        # for each position, the percept code digits contributed by walls, and the
+        # (index, weight) pairs of the neighbouring cells that are on the grid
+        self._wallDigits = []
+        self._neighbours = []
+        # for each move action code, the position each position moves to, or -1 into a wall
+        self._moves = [[], [], [], []]
+        for r in range(numRows):
+            for c in range(numCols):
+                i = r*numCols + c
+                walls = 0
+                neighbours = []
+                for code, offGrid, j, weight in [(MOVE_NORTH, r == self.topRow, i - numCols, 81),
+                                                 (MOVE_SOUTH, r == self.bottomRow, i + numCols, 27),
+                                                 (MOVE_EAST, c == self.rightCol, i + 1, 9),
+                                                 (MOVE_WEST, c == self.leftCol, i - 1, 3)]:
+                    if offGrid:
+                        walls += WALL * weight
+                        self._moves[code].append(-1)
+                    else:
+                        neighbours.append((j, weight))
+                        self._moves[code].append(j)
+                self._wallDigits.append(walls)
+                self._neighbours.append(tuple(neighbours))
+        self.updatePercept()
+
+    # set up what every kind of world has: the grid bounds, robby's position and the source of randomness
+    def _initWorld(self, numRows, numCols, rng):
+        self.numRows = numRows
+        self.numCols = numCols
+        self.topRow = 0
+        self.bottomRow = numRows-1
+        self.leftCol = 0
+        self.rightCol = numCols-1
+        # current position of robby, as the index row*numCols + col of his cell
+        self.robbyPos = 0
+        # source of randomness for distributeCans and MoveRandom: a RandomStream, a random.Random,
+        # or by default the random module itself until seeded
+        self.rng = random if rng is None else rng
+
+    @property
+    def robbyRow(self):
+        return self.robbyPos // self.numCols
+
+    @property
+    def robbyCol(self):
+        return self.robbyPos % self.numCols
+
+    # give this world its own random number generator, so that its can layouts
+    # and random moves are reproducible independently of any other world
+    def seed(self, a=None):
+        if self.rng is random:
+            self.rng = random.Random(a)
+        else:
+            self.rng.seed(a)
+
+    # a headless world has nothing to draw, but accepts the same calls as the Tk view
+    def graphicsOff(self, message=""):
+        pass
+
+    def graphicsOn(self):
+        pass
+
+    def getCell(self, row, col):
+        return self.cells[row*self.numCols + col]
+
+    def setCell(self, row, col, state):
+        assert state in (EMPTY, CAN)
+        self.cells[row*self.numCols + col] = state
+        self.updatePercept()
+
+    def getContents(self, row, col):
+        return CELL_CHARS[self.cells[row*self.numCols + col]]
+
+    def setContents(self, row, col, newContents):
+        assert newContents in ["E", "C"]
+        self.cells[row*self.numCols + col] = CAN if newContents == "C" else EMPTY
+        self.updatePercept()
+
+    # set every cell at once from a sequence of cell states in row-major order
+    def setCells(self, states):
+        self.cells[:] = bytes(states)
+        self.updatePercept()
+
+    def distributeCans(self, density=0.50):
+        cells = self.cells
+        if hasattr(self.rng, "bernoulli"):
+            # a RandomStream draws the whole grid at once
+            cells[:] = self.rng.bernoulli(len(cells), density)
+        else:
+            for i in range(len(cells)):
+                cells[i] = CAN if self.rng.uniform(0, 1) < density else EMPTY
+        self.updatePercept()
+
+    def _gridContents(self):
+        return "".join([CELL_CHARS[state] for state in self.cells])
+
+    def performAction(self, action):
+        code = ACTION_CODES.get(action)
+        if code is None:
+            print("ERROR -- possible actions are:\n%s" % POSSIBLE_ACTIONS)
+            return
+        if code == MOVE_RANDOM:
+            # the same draw as choosing from the four moves with rng.choice
+            code = self.rng.randrange(4)
+        if code < STAY_PUT:
+            return self._move(code)
+        elif code == PICK_UP_CAN:
+            return self._pickUp()
+        else:
+            return 0
+
+    # move robby in the direction of a move action code, returning the reward
+    def _move(self, code):
+        newPos = self._moves[code][self.robbyPos]
+        if newPos < 0:
+            return -5
+        self.robbyPos = newPos
+        self.updatePercept()
+        return 0
+
+    # pick up the can under robby, if any, returning the reward
+    def _pickUp(self):
+        i = self.robbyPos
+        if self.cells[i] == CAN:
+            # only the "here" digit of the percept changes
+            self.cells[i] = EMPTY
+            self.perceptCode -= CAN
+            return +10
+        return -1
+
+    # abbreviations
+    def north(self):
+        return self.performAction("MoveNorth")
+    def south(self):
+        return self.performAction("MoveSouth")
+    def east(self):
+        return self.performAction("MoveEast")
+    def west(self):
+        return self.performAction("MoveWest")
+    def stay(self):
+        return self.performAction("StayPut")
+    def grab(self):
+        return self.performAction("PickUpCan")
+    def random(self):
+        return self.performAction("MoveRandom")
+    def look(self):
+        return self.getPercept()
+
+    def _perceptStates(self):
+        # cell states north, south, east, west and here, with WALL for cells off the grid
+        cells = self.cells
+        i = self.robbyPos
+        n = WALL if self.robbyRow == self.topRow else cells[i - self.numCols]
+        s = WALL if self.robbyRow == self.bottomRow else cells[i + self.numCols]
+        e = WALL if self.robbyCol == self.rightCol else cells[i + 1]
+        w = WALL if self.robbyCol == self.leftCol else cells[i - 1]
+        return n, s, e, w, cells[i]
+
+    def getPercept(self):
+        return "".join([CELL_CHARS[state] for state in self._perceptStates()])
+
+    # recompute the percept code from the cells around robby's current position
+    def updatePercept(self):
+        cells = self.cells
+        i = self.robbyPos
+        code = self._wallDigits[i] + cells[i]
+        for j, weight in self._neighbours[i]:
+            code += weight * cells[j]
+        self.perceptCode = code
+
+    # returns the code number of the current percept (example: returns 19 for "EEWEC")
+    def getPerceptCode(self):
+        return self.perceptCode
+
+    def getCurrentPosition(self):
+        return self.robbyRow, self.robbyCol
+
+    # returns a hashable value identifying the full state of the world (robby's position and the grid)
+    def getState(self):
+        return self.robbyRow, self.robbyCol, bytes(self.cells)
+
+    def goto(self, newRow, newCol):
+        assert 0 <= newRow < self.numRows and 0 <= newCol < self.numCols
+        self.robbyPos = newRow*self.numCols + newCol
+        self.updatePercept()
+
+    def show(self):
+        grid = self._gridContents()
+        s = ""
+        for r in range(self.numRows):
+            for c in range(self.numCols):
+                contents = grid[r*self.numCols + c]
+                if r == self.robbyRow and c == self.robbyCol:
+                    s += "CR " if contents == "C" else "R  "
+                else:
+                    s += "C  " if contents == "C" else ".  "
+            s += "\n"
+        print(s.strip())
+
+    def load(self, configFilename):
+        f = open(configFilename)
+        lines = [line.strip() for line in f]
+        f.close()
+        if len(lines) != self.numRows + 2 or len(lines[0]) != self.numCols:
+            print("ERROR -- invalid grid format in file %s" % configFilename)
+            return False
+        self.setCells(EMPTY if char == "." else CAN for line in lines[:self.numRows] for char in line)
+        self.goto(int(lines[-2]), int(lines[-1]))
+        return True
+
+    def save(self, configFilename):
+        grid = self._gridContents().replace("E", ".")
+        f = open(configFilename, "w")
+        for r in range(self.numRows):
+            f.write(grid[r*self.numCols:(r+1)*self.numCols])
+            f.write("\n")
+        f.write("%d\n" % self.robbyRow)
+        f.write("%d\n" % self.robbyCol)
+        f.close()
+        print("Configuration saved in file %s" % configFilename)
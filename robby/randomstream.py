@@ -0,0 +1,135 @@
+"""
+Buffered random number streams
+
+A RandomStream hands out random numbers drawn from a NumPy generator in
+large blocks, so that code making one draw at a time (a MoveRandom
+step, a single genome's world seed) pays for a list lookup rather than
+a Python-level RNG call, while bulk draws (a whole grid of cans, a
+population's mutations) go straight to NumPy.
+
+A stream accepts the calls the rest of the code makes on the random
+module (random, uniform, randrange, choice, getrandbits, seed) and on
+NumPy generators (random, integers, geometric with a size), so it can
+be passed to HeadlessWorld, World, RobbyTrainer and the crossover and
+selection functions in place of either. Every stream has its own state:
+streams for parallel workers or islands are made with spawn(), which
+gives statistically independent children that are reproducible from
+the parent's seed.
+
+Commands
+--------
+rs = RandomStream(seed)
+
+rs.random()
+rs.random(size)
+rs.integers(low, high, size)
+rs.randrange(n)
+rs.getrandbits(k)
+rs.seeds(n)
+rs.spawn(n)
+rs.getstate()
+rs.setstate(state)
+
+"""
+
+import random
+import struct
+
+import numpy as np
+
+# number of values drawn at a time for single draws
+BLOCK_SIZE = 4096
+
+# packed state of a PCG64 generator: state, increment, whether a 32-bit value is buffered, and that value
+_PCG64_FORMAT = "<16s16sII"
+
+
+def _packGenerator(generator):
+    state = generator.bit_generator.state
+    return struct.pack(_PCG64_FORMAT, state["state"]["state"].to_bytes(16, "little"),
+                       state["state"]["inc"].to_bytes(16, "little"), state["has_uint32"], state["uinteger"])
+
+
+def _unpackGenerator(generator, packed):
+    state, inc, hasUint32, uinteger = struct.unpack(_PCG64_FORMAT, packed)
+    generator.bit_generator.state = {
+        "bit_generator": "PCG64",
+        "state": {"state": int.from_bytes(state, "little"), "inc": int.from_bytes(inc, "little")},
+        "has_uint32": hasUint32,
+        "uinteger": uinteger,
+    }
+
+
+class RandomStream:
+
+    # seed may be an int, a NumPy SeedSequence, or None to draw a seed from the random module, so that
+    # random.seed() alone makes a run reproducible
+    def __init__(self, seed=None, blockSize=BLOCK_SIZE):
+        self.blockSize = blockSize
+        self.seed(seed)
+
+    def seed(self, a=None):
+        if a is None:
+            a = random.getrandbits(64)
+        self.seedSequence = a if isinstance(a, np.random.SeedSequence) else np.random.SeedSequence(a)
+        self.generator = np.random.Generator(np.random.PCG64(self.seedSequence))
+        # values drawn ahead for single draws, and the position of the next one
+        self._block = []
+        self._pos = 0
+
+    # returns n independent streams, reproducible from this stream's seed
+    def spawn(self, n):
+        return [RandomStream(child, self.blockSize) for child in self.seedSequence.spawn(n)]
+
+    def _refill(self):
+        self._block = self.generator.random(self.blockSize).tolist()
+        self._pos = 0
+
+    # a float in [0, 1), or an array of them if given a size
+    def random(self, size=None):
+        if size is not None:
+            return self.generator.random(size)
+        if self._pos == len(self._block):
+            self._refill()
+        value = self._block[self._pos]
+        self._pos += 1
+        return value
+
+    def uniform(self, a=0.0, b=1.0):
+        return a + (b - a) * self.random()
+
+    # an int in [0, n), exactly uniform when n is a power of two and otherwise to within n / 2**53
+    def randrange(self, n):
+        return int(self.random() * n)
+
+    def choice(self, seq):
+        return seq[self.randrange(len(seq))]
+
+    def getrandbits(self, k):
+        return int.from_bytes(self.generator.bytes((k + 7) // 8), "little") & ((1 << k) - 1)
+
+    # a list of n 64-bit seeds, for seeding one world or generator each
+    def seeds(self, n):
+        return self.generator.integers(0, 2**64, n, dtype=np.uint64, endpoint=False).tolist()
+
+    # a bytes object of n cell states, each 1 with probability p and 0 otherwise
+    def bernoulli(self, n, p):
+        return (self.generator.random(n) < p).astype(np.uint8).tobytes()
+
+    # the NumPy generator methods used for bulk draws
+    def integers(self, low, high=None, size=None, dtype=np.int64):
+        return self.generator.integers(low, high, size, dtype=dtype)
+
+    def geometric(self, p, size=None):
+        return self.generator.geometric(p, size)
+
+    # the state of the stream as bytes, which setstate() restores exactly: the generator's state and the values
+    # drawn ahead but not handed out yet
+    def getstate(self):
+        return _packGenerator(self.generator) + np.array(self._block[self._pos:], dtype=np.float64).tobytes()
+
+    def setstate(self, state):
+        size = struct.calcsize(_PCG64_FORMAT)
+        _unpackGenerator(self.generator, state[:size])
+        self._block = np.frombuffer(state[size:], dtype=np.float64).tolist()
+        self._pos = 0
@@ -1,7 +1,35 @@
-from random import random, choice, randrange
+from collections import namedtuple
+from contextlib import nullcontext
+from itertools import count
+from multiprocessing import Pool
+from random import getstate, setstate
 from sys import maxsize
-
-POSSIBLE_ACTIONS = ["MoveNorth", "MoveSouth", "MoveEast", "MoveWest", "StayPut", "PickUpCan", "MoveRandom"]
+from time import perf_counter
+
+import numpy as np
+
+from cache import FitnessCache
+from checkpoint import Checkpoint
+from evaluator import BatchEvaluator
+from fitness import NUM_ACTIONS
+from genome import GENOME_LENGTH, from_string, to_string, random_genome
+from population import SortedPopulation
+from robby.headless import CAN, HeadlessWorld, MOVE_RANDOM, PICK_UP_CAN
+from robby.randomstream import RandomStream
+from training_log import TrainingLog
+from viewer import DemoViewer
+from worldbank import WorldBank
+
+# Values drawn ahead at a time by the stream of the world genomes are evaluated in, which is reseeded for every
+# evaluation and only needs a few draws for random moves
+WORLD_BLOCK_SIZE = 64
+
+# What iter_train() yields for each generation: the generation's fitness summary and champion (the genome with the
+# highest fitness, as bytes), the all-time best (genome, fitness) tuple so far, and the generation's time in seconds
+GenerationRecord = namedtuple(
+    "GenerationRecord",
+    ["generation", "min_fitness", "mean_fitness", "max_fitness", "std_fitness", "champion", "best", "seconds"]
+)
 
 
 class RobbyTrainer:
@@ -14,11 +42,33 @@ class RobbyTrainer:
             selection_func,
             reward_func,
             can_fill_rate=0.25,
-            steps=200
+            steps=200,
+            batched=False,
+            workers=1,
+            fixed_worlds=0,
+            cache_size=0,
+            world_bank=None,
+            bank_subset=0,
+            rotate_bank=False,
+            async_demos=False,
+            profiler=None,
+            rng=None,
+            race=None,
+            steady_state=0
     ):
 
-        self.world = world
-        self.world.graphicsOff()
+        # All of the trainer's random numbers come from one RandomStream, seeded from the random module unless given
+        self.rng = rng if rng is not None else RandomStream()
+
+        # Evaluate genomes in a headless model of the given world, the Tk view (if given one) is only used for demos.
+        # Headless worlds are evaluated in a world of the same kind, so passing a BitboardWorld trains on bitboards
+        world_class = type(world) if isinstance(world, HeadlessWorld) else HeadlessWorld
+        self.world = world_class(world.numRows, world.numCols, RandomStream(blockSize=WORLD_BLOCK_SIZE))
+        self.view = None if isinstance(world, HeadlessWorld) else world
+        if self.view is not None:
+            # Demos draw from a stream like the evaluation world's, so a demo seed reproduces the world it came from
+            self.view.model.rng = RandomStream(blockSize=WORLD_BLOCK_SIZE)
+            self.view.graphicsOff()
 
         self.output_file = output_file
         self.mutation_rate = mutation_rate
@@ -29,6 +79,98 @@ class RobbyTrainer:
         self.can_fill_rate = can_fill_rate
         self.steps = steps
 
+        # Optionally evaluate the whole population in lockstep with NumPy instead of one genome at a time
+        self.batch_evaluator = None
+        if batched:
+            self.batch_evaluator = BatchEvaluator(world.numRows, world.numCols, reward_func, can_fill_rate, steps)
+
+        # Optionally split fitness evaluation between several worker processes, started on first use
+        self.workers = workers
+        self.pool = None
+
+        # Optionally evaluate every genome on the same bank_subset worlds from a bank of pre-generated layouts (a
+        # WorldBank or the name of a saved one) and average, instead of on one fresh random world per genome. This
+        # compares genomes on common worlds, and makes each genome's fitness deterministic unless rotate_bank is set
+        # to move on to the next subset of the bank every generation. fixed_worlds=N is a shortcut for a bank of N
+        # freshly generated worlds
+        self.fixed_worlds = fixed_worlds
+        if fixed_worlds > 0:
+            world_bank = WorldBank.generate(fixed_worlds, world.numRows, world.numCols, can_fill_rate)
+        elif isinstance(world_bank, str):
+            world_bank = WorldBank.load(world_bank)
+        self.world_bank = world_bank
+        if world_bank is not None:
+            assert (world_bank.num_rows, world_bank.num_cols) == (world.numRows, world.numCols)
+            self.bank_subset = bank_subset if 0 < bank_subset <= len(world_bank) else len(world_bank)
+        self.rotate_bank = rotate_bank
+        self.bank_offset = 0
+
+        # Optionally cache fitness values by genome (and by bank subset when rotating). This needs bank worlds, since
+        # a genome's fitness in one fresh random world is noise that the cache would freeze
+        self.cache = FitnessCache(cache_size) if cache_size > 0 else None
+        assert self.cache is None or world_bank is not None
+
+        # Optionally demo in a separate viewer process, started on the first demo, so training carries on meanwhile
+        self.async_demos = async_demos
+        self.viewer = None
+
+        # Optionally time each phase of training with a PhaseProfiler
+        self.profiler = profiler
+
+        # Optionally evaluate with a FitnessRace, which runs each genome in as many fresh random worlds as it takes to
+        # rank the elite reliably. Its fitness values are mean rewards, so it can't be combined with bank worlds (nor
+        # with the cache, which needs them)
+        self.race = race
+        assert race is None or world_bank is None
+
+        # Optionally train in steady-state mode, replacing the steady_state worst genomes with as many new children at
+        # each step and evaluating only the children, instead of breeding and evaluating a whole new generation
+        self.steady_state = steady_state
+
+        # The last generation iter_train() evaluated, as a population matrix and its list of fitness values, both in
+        # ascending order of fitness (see top_genomes())
+        self.ranked = None
+
+    def __getstate__(self):
+        # Worker processes get a copy of the trainer without the Tk view, the demo viewer, the process pool, the
+        # cache, the profiler or the last generation
+        state = self.__dict__.copy()
+        state["ranked"] = None
+        state["view"] = None
+        state["viewer"] = None
+        state["profiler"] = None
+        state["pool"] = None
+        state["cache"] = None
+        return state
+
+    def close(self):
+        # Shut down the worker processes and the demo viewer, if they were started
+
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        if self.viewer is not None:
+            self.viewer.close()
+            self.viewer = None
+
+    def phase(self, name):
+        # Return a context manager timing a phase of training with the profiler, or doing nothing without one
+        return self.profiler.phase(name) if self.profiler is not None else _NOT_PROFILING
+
+    def demo(self, genome, seed):
+        # Demo a genome in the world generated from seed, either by handing it to the viewer process or in the Tk
+        # view, which pauses training until the demo is over
+
+        if self.async_demos:
+            if self.viewer is None:
+                self.viewer = DemoViewer(self.world.numRows, self.world.numCols, self.steps, self.can_fill_rate)
+            self.viewer.show(genome, seed)
+        elif self.view is not None:
+            self.view.model.seed(seed)
+            self.view.demo(to_string(genome), self.steps, self.can_fill_rate)
+            self.view.graphicsOff()
+
     # ------------------------------------------------------------------------------------------------------------ #
     #                                           INITIALIZATION FUNCTIONS                                           #
     # ------------------------------------------------------------------------------------------------------------ #
@@ -37,131 +179,521 @@ class RobbyTrainer:
     def generate_genome():
         # Generate a single completely random genome
 
-        genome = ""
-        for i in range(243):
-            genome += str(randrange(0, 7))
-        return genome
+        return random_genome()
 
     @staticmethod
-    def generate_population(size):
-        # Generate a population of size random genomes
+    def generate_population(size, rng=None):
+        # Generate a population of size random genomes, as a matrix with one genome per row, from rng if given or
+        # the random module otherwise
 
-        return [RobbyTrainer.generate_genome() for _ in range(size + 1)]
+        if rng is not None:
+            return rng.integers(0, NUM_ACTIONS, (size + 1, GENOME_LENGTH), dtype=np.uint8)
+        genomes = random_genome(GENOME_LENGTH * (size + 1))
+        return np.frombuffer(genomes, dtype=np.uint8).reshape(size + 1, GENOME_LENGTH).copy()
 
     # ------------------------------------------------------------------------------------------------------------ #
     #                                               FITNESS HANDLERS                                               #
     # ------------------------------------------------------------------------------------------------------------ #
 
-    def get_fitness(self, genome):
+    def get_fitness(self, genome, seed=None, layout=None):
         # Return the fitness of a given genome based on cumulative reward of running STEPS times in a random world
+        # The world is generated from seed if given, otherwise from a seed drawn from the trainer's stream. If given a
+        # can layout (one EMPTY or CAN per cell), that is used instead of distributing cans and seed only affects
+        # random moves
+        # Genomes in string format are accepted too
+
+        if isinstance(genome, str):
+            genome = from_string(genome)
 
         # Regenerate world and place Robby in the top left corner
-        self.world.distributeCans(self.can_fill_rate)
+        self.world.seed(self.rng.getrandbits(64) if seed is None else seed)
+        if layout is None:
+            self.world.distributeCans(self.can_fill_rate)
+        else:
+            self.world.setCells(layout)
         self.world.goto(0, 0)
 
         # Run STEPS times and sum the reward of the action of each step
+        world = self.world
+        table = self.reward_func.table
         reward = 0
+
+        # Cumulative reward after each step, and number of cans picked up so far. Cans are only ever removed, so
+        # Robby's position and the number of cans picked up identify the full (position, grid) state of the world
+        totals = [0]
+        picked = 0
+        num_cells = world.numRows * world.numCols
+
+        # Once no more random actions are taken, a genome's actions depend only on the state, so Robby is stuck in a
+        # loop as soon as a state repeats. States are checked against one saved state, which is replaced at doubling
+        # intervals (Brent's cycle detection) and whenever a random action is taken
+        saved_state = 0
+        saved_step = 0
+        period = 1
+
         for i in range(self.steps):
-            # Get percept and find the corresponding action from current genome
-            p = self.world.getPerceptCode()
-            action = POSSIBLE_ACTIONS[int(genome[p])]
+            # Get percept and find the corresponding action code from current genome
+            p = world.perceptCode
+            code = genome[p]
 
             # Get the reward value of the action taken
-            reward += self.reward_func(self.world, action)
+            reward += table[p * NUM_ACTIONS + code]
+            totals.append(reward)
 
             # Have Robby make the move in the world
-            self.world.performAction(action)
+            world.performAction(code)
+            if code == PICK_UP_CAN and p % 3 == CAN:
+                picked += 1
+
+            step = i + 1
+            state = picked * num_cells + world.robbyPos
+            if code == MOVE_RANDOM:
+                saved_state, saved_step, period = state, step, 1
+            elif state == saved_state:
+                # The steps from saved_step to here will repeat for the rest of the run, so add up whole cycles and
+                # the first few steps of one more
+                cycle = step - saved_step
+                remaining = self.steps - step
+                return reward + remaining // cycle * (reward - totals[saved_step]) + \
+                    totals[saved_step + remaining % cycle] - totals[saved_step]
+            elif step - saved_step == period:
+                saved_state, saved_step, period = state, step, period * 2
 
         return reward
 
-    def sort_by_fitness(self, genomes):
-        # Return a given list of genomes sorted by fitness values and the corresponding sorted list of fitness values
+    def evaluate(self, genomes, seeds, world_ids=None):
+        # Return the list of fitness values of the genomes in a population matrix, each run in a world generated from
+        # its own seed, or in the bank world with the given id if given world ids
+
+        layouts = None if world_ids is None else self.world_bank.layouts(world_ids)
+
+        if self.batch_evaluator is not None:
+            return self.batch_evaluator(genomes, seeds, layouts).tolist()
+        if layouts is None:
+            return [self.get_fitness(g.tobytes(), s) for g, s in zip(genomes, seeds)]
+        return [self.get_fitness(g.tobytes(), s, l.tobytes()) for g, s, l in zip(genomes, seeds, layouts)]
+
+    def parallel_evaluate(self, genomes, seeds, world_ids=None):
+        # Evaluate the genomes in chunks spread over the worker processes, returning fitness values in order
+
+        if self.pool is None:
+            self.pool = Pool(self.workers, initializer=_init_worker, initargs=(self,))
+
+        # Use a few chunks per worker so that uneven chunks don't leave workers idle
+        size = -(-len(genomes) // (self.workers * 4))
+        # Bank worlds are sent as ids only, each worker reads the layouts from its own copy (or mapping) of the bank
+        chunks = [(genomes[i:i + size], seeds[i:i + size], None if world_ids is None else world_ids[i:i + size])
+                  for i in range(0, len(genomes), size)]
+        return [f for chunk in self.pool.map(_evaluate_chunk, chunks) for f in chunk]
+
+    def population_fitness(self, genomes, bank_worlds=None):
+        # Return the list of fitness values of the genomes in a population matrix, using worker processes if enabled
+        # When using a bank, genomes are run in the given bank worlds, or in the next ones if not given any
+
+        if self.world_bank is None:
+            return self.run_trials(genomes)
+
+        # Run every genome once in each of this generation's bank worlds
+        if bank_worlds is None:
+            bank_worlds = self.next_bank_worlds()
+        world_ids = np.tile(bank_worlds, len(genomes))
+        repeats = len(bank_worlds)
+        rewards = self.run_trials(np.repeat(genomes, repeats, axis=0), world_ids)
+        return [sum(rewards[i:i + repeats]) / repeats for i in range(0, len(rewards), repeats)]
+
+    def run_trials(self, genomes, world_ids=None):
+        # Return the list of rewards of running each genome in a population matrix once, in a fresh random world or in
+        # the bank world with the given id if given world ids, using worker processes if enabled
+
+        if world_ids is None:
+            # Draw a world seed for each genome up front, so the results don't depend on how the work is split up
+            seeds = self.rng.seeds(len(genomes))
+        else:
+            seeds = self.world_bank.world_seeds(world_ids)
+
+        if self.profiler is not None:
+            self.profiler.count_evaluations(len(genomes), self.steps)
+
+        if self.workers > 1:
+            return self.parallel_evaluate(genomes, seeds, world_ids)
+        return self.evaluate(genomes, seeds, world_ids)
+
+    def raced_population_fitness(self, genomes):
+        # Return the list of mean rewards of the genomes in a population matrix, each run in as many fresh random
+        # worlds as the race needs to rank it
+        return self.race(len(genomes), lambda indices: self.run_trials(genomes[indices]))
+
+    def next_bank_worlds(self):
+        # Return the ids of the bank worlds to evaluate the next generation on, which are the same every generation
+        # unless rotating through the bank
+
+        bank_worlds = (self.bank_offset + np.arange(self.bank_subset)) % len(self.world_bank)
+        if self.rotate_bank:
+            self.bank_offset = (self.bank_offset + self.bank_subset) % len(self.world_bank)
+        return bank_worlds
+
+    def cached_population_fitness(self, genomes):
+        # Return the list of fitness values of the genomes in a population matrix, looking them up in the cache first
+        # and evaluating each distinct uncached genome only once
+
+        # Move on to the next bank worlds even if every genome turns out to be cached, so that the rotation is the
+        # same as without a cache. When rotating, a genome's fitness also depends on which worlds it is evaluated on
+        bank_worlds = self.next_bank_worlds()
+        context = str(bank_worlds[0]).encode() if self.rotate_bank else b""
+        keys = [FitnessCache.key(g, context) for g in genomes]
+        known = {}
+        missing = {}
+        for i, key in enumerate(keys):
+            if key not in known and key not in missing:
+                fitness = self.cache.get(key)
+                if fitness is None:
+                    missing[key] = i
+                else:
+                    known[key] = fitness
+
+        if missing:
+            new_values = self.population_fitness(genomes[list(missing.values())], bank_worlds)
+            for key, fitness in zip(missing, new_values):
+                known[key] = fitness
+                self.cache.put(key, fitness)
+
+        return [known[key] for key in keys]
 
-        tuples = [(self.get_fitness(g), g) for g in genomes]
-        tuples.sort()
-        sorted_fitness_values = [f for (f, g) in tuples]
-        sorted_genomes = [g for (f, g) in tuples]
+    def sort_by_fitness(self, genomes):
+        # Return a given population matrix sorted by fitness values and the corresponding sorted list of fitness values
+
+        if self.race is not None:
+            fitness_values = self.raced_population_fitness(genomes)
+        elif self.cache is not None:
+            fitness_values = self.cached_population_fitness(genomes)
+        else:
+            fitness_values = self.population_fitness(genomes)
+
+        order = np.argsort(fitness_values, kind="stable")
+        sorted_fitness_values = [fitness_values[i] for i in order]
+        sorted_genomes = genomes[order]
         return sorted_genomes, sorted_fitness_values
 
     # ------------------------------------------------------------------------------------------------------------ #
     #                                             MUTATION HANDLERS                                                #
     # ------------------------------------------------------------------------------------------------------------ #
 
+    @staticmethod
+    def mutation_sites(rng, size, rate):
+        # Return the sorted indices of the sites mutated among size genes, each mutated independently with probability
+        # rate, by drawing the gaps between consecutive sites from a geometric distribution instead of testing every
+        # gene, so the cost scales with the number of mutations rather than the number of genes
+
+        if rate <= 0:
+            return np.empty(0, dtype=np.int64)
+        if rate >= 1:
+            return np.arange(size)
+
+        blocks = []
+        last_site = -1
+        block_size = int(size * rate * 1.1) + 16
+        while last_site < size:
+            sites = last_site + np.cumsum(rng.geometric(rate, block_size))
+            blocks.append(sites[sites < size])
+            last_site = sites[-1]
+        return np.concatenate(blocks)
+
+    def mutate_population(self, population, rng=None):
+        # Replace each action code in the given population matrix with a random one with probability MUTATION_RATE,
+        # finding every mutation site of the whole population at once and applying them in bulk, in place
+
+        flat = population.reshape(-1)
+
+        if rng is None:
+            rng = self.rng
+        sites = self.mutation_sites(rng, flat.size, self.mutation_rate)
+        flat[sites] = rng.integers(0, NUM_ACTIONS, len(sites), dtype=np.uint8)
+
+        return population
+
     def mutate_genome(self, genome):
-        # Replace each character in the given genome with a random one with probability MUTATION_RATE
+        # Replace each action code in the given genome with a random one with probability MUTATION_RATE
 
-        mutated_genome = list(genome)
-        for i in range(len(genome)):
-            if random() < self.mutation_rate:
-                mutated_genome[i] = str(choice(range(0, 7)))
-        return ''.join(mutated_genome)
+        population = np.frombuffer(genome, dtype=np.uint8).reshape(1, -1).copy()
+        return self.mutate_population(population)[0].tobytes()
 
     def mutate_generation(self, sorted_genomes, fitness_vals):
-        # Take sorted lists of genomes and fitness values and return a new generation of crossed over/mutated genomes
+        # Take a sorted population matrix and list of fitness values and return a new generation of crossed
+        # over/mutated genomes
 
-        # Make all weights positive to allow for python random library weighted choice
+        # Make all weights positive to allow for weighted choice
         offset = abs(min(fitness_vals))
         weights = [v + offset for v in fitness_vals]
 
-        # Build next generation by selecting parents, crossing over their genomes, mutating the result, and appending
-        # it to the new generation
-        next_generation = []
-        for i in range(len(sorted_genomes) + 1):
-            # Select two parents and create a child from their genomes
-            parents = self.selection_func(sorted_genomes, weights)
-            fresh_child = self.crossover_func(parents[0], parents[1])
-
-            # Mutate crossed over child
-            mutated_child = self.mutate_genome(fresh_child)
-
-            # Add crossed over and mutated child to next generation
-            next_generation.append(mutated_child)
-
-        return next_generation
+        # The trainer's stream drives selection, crossover and mutation
+        rng = self.rng
+
+        # Build a sampler from the weights once, and draw the indices of two parents for every child in one call
+        with self.phase("selection"):
+            draw_parents = self.selection_func.sampler(weights)
+            parents = draw_parents(len(sorted_genomes) + 1, rng)
+
+        # Cross over and then mutate all children in one go
+        with self.phase("crossover"):
+            children = self.crossover_func.batch(sorted_genomes, parents[:, 0], parents[:, 1], rng)
+        with self.phase("mutation"):
+            return self.mutate_population(children, rng)
+
+    def steady_state_generation(self, sorted_genomes, fitness_vals):
+        # Take a sorted population matrix and its sorted list of fitness values, and return them after a generation's
+        # worth of steady-state steps, i.e. once as many children as there are genomes have been bred
+        # Each step breeds a batch of children from the current population, evaluates only them, and has them replace
+        # the worst genomes. The population is kept in a SortedPopulation, so that each step costs O(log n) per child
+        # for drawing parents and finding where children rank, rather than O(n)
+
+        population = SortedPopulation(sorted_genomes, fitness_vals)
+        draw_parents = self.selection_func.population_sampler(population)
+        genomes = population.genomes
+        rng = self.rng
+
+        for bred in range(0, len(population), self.steady_state):
+            batch_size = min(self.steady_state, len(population) - bred)
+
+            # Draw the two parents of every child
+            with self.phase("selection"):
+                parents = draw_parents(batch_size, rng).reshape(-1)
+                parent_genomes = np.frombuffer(b"".join([genomes[i] for i in parents]), dtype=np.uint8)
+                parent_genomes = parent_genomes.reshape(len(parents), GENOME_LENGTH)
+
+            with self.phase("crossover"):
+                pairs = np.arange(0, len(parents), 2)
+                children = self.crossover_func.batch(parent_genomes, pairs, pairs + 1, rng)
+            with self.phase("mutation"):
+                children = self.mutate_population(children, rng)
+
+            with self.phase("evaluate"):
+                children, child_fitness_vals = self.sort_by_fitness(children)
+
+            population.replace_worst(children, child_fitness_vals)
+
+        return population.sorted()
+
+    def immigrate(self, population, fitness_vals, migrants, migrant_fitness_vals):
+        # Return the population matrix about to be evaluated and its fitness values with migrants from another
+        # population in place of some of its genomes
+        # In steady-state mode the population is sorted and the migrants replace its worst genomes, keeping their
+        # fitness values. Otherwise the population is a new generation of children, yet to be evaluated and in no
+        # particular order, so the migrants replace the last ones
+
+        if self.steady_state > 0 and len(fitness_vals) == len(population):
+            sorted_population = SortedPopulation(population, fitness_vals)
+            sorted_population.replace_worst(migrants, migrant_fitness_vals)
+            return sorted_population.sorted()
+
+        population = population.copy()
+        population[len(population) - len(migrants):] = migrants
+        return population, fitness_vals
 
     # ------------------------------------------------------------------------------------------------------------ #
     #                                          OVERALL TRAINING HANDLER                                            #
     # ------------------------------------------------------------------------------------------------------------ #
 
-    def train(self, pop_size, generations, print_interval=10, demo_interval=20):
-        # Assess, cross over, and mutate a population a genomes for a specified number of generations
+    def top_genomes(self, count):
+        # Return the count best genomes of the last generation evaluated, as a matrix, and their fitness values, both
+        # in ascending order of fitness
+
+        sorted_genomes, fitness_vals = self.ranked
+        return sorted_genomes[-count:], fitness_vals[-count:]
+
+    def checkpoint(self, generation, population, fitness_vals, best_genome):
+        # Return a Checkpoint of training at the start of a generation, with the current random and world bank state
+
+        bank_seed = self.world_bank.seed if self.world_bank is not None else 0
+        return Checkpoint(
+            generation, population, fitness_vals, best_genome, getstate(), self.bank_offset, self.rng.getstate(),
+            bank_seed
+        )
+
+    def restore_world_bank(self, bank_seed):
+        # Make sure training resumes on the world bank the checkpoint was taken with, which has the given seed
+
+        if self.world_bank is None or self.world_bank.seed == bank_seed:
+            return
+        if self.fixed_worlds == 0:
+            raise ValueError("resuming with a different world bank from the one the checkpoint was taken with")
+
+        # The bank was generated from the random module when this trainer was made, so generate the run's bank again,
+        # and drop anything evaluated on the other one
+        self.world_bank = WorldBank.generate(
+            self.fixed_worlds, self.world.numRows, self.world.numCols, self.can_fill_rate, bank_seed
+        )
+        if self.cache is not None:
+            self.cache = FitnessCache(self.cache.max_size)
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def iter_train(self, pop_size, generations=None, checkpoint_file=None, checkpoint_interval=10, resume_from=None):
+        # Assess, cross over, and mutate a population of genomes for a specified number of generations, or forever
+        # if generations is None, yielding a GenerationRecord after each generation
+        # The caller can stop early simply by not asking for more generations, and should call close() when done
+        #
+        # If checkpoint_file is given, a checkpoint is written to it every checkpoint_interval generations, and also
+        # when training is interrupted by Ctrl-C or stopped early. Passing a checkpoint file as resume_from continues
+        # the run it was taken from exactly as if it had never stopped
+        #
+        # In steady-state mode a generation is as many steady-state steps as it takes to breed one child per genome,
+        # and the population is carried over from one generation to the next along with its fitness values
+        #
+        # Sending the generator a (genomes, fitness values) tuple of migrants instead of just asking for the next
+        # generation adds them to the population before it is run (see immigrate()). The generation just evaluated is
+        # left in self.ranked, for the caller to pick emigrants from (see top_genomes())
+
+        if resume_from is None:
+            # Create population of random genomes of size pop_size
+            population = RobbyTrainer.generate_population(pop_size, self.rng)
+
+            # Initialize all-time best genome variable with an empty genome and the lowest possible fitness value
+            best_genome = (b"", -maxsize - 1)
+            first_generation = 0
+            fitness_vals = []
+        else:
+            # Continue from the start of a generation, with the random state as it was then
+            resumed = Checkpoint.load(resume_from)
+            population = resumed.population
+            best_genome = resumed.best_genome
+            first_generation = resumed.generation
+            fitness_vals = resumed.fitness_values
+            self.bank_offset = resumed.bank_offset
+            setstate(resumed.random_state)
+            self.rng.setstate(resumed.stream_state)
+            self.restore_world_bank(resumed.bank_seed)
+
+        # Everything needed to carry on from the start of the current generation, which is cheap to keep since
+        # nothing in it is modified afterwards
+        snapshot = self.checkpoint(first_generation, population, fitness_vals, best_genome)
+        try:
+            for i in range(first_generation, generations) if generations is not None else count(first_generation):
+                start = perf_counter()
+                if self.profiler is not None:
+                    self.profiler.start_generation(i)
+
+                if self.steady_state > 0:
+                    # The population carries over sorted, with its fitness values, except at the start of training
+                    if len(fitness_vals) != len(population):
+                        with self.phase("evaluate"):
+                            population, fitness_vals = self.sort_by_fitness(population)
+                    sorted_genomes, fitness_vals = self.steady_state_generation(population, fitness_vals)
+                    population = sorted_genomes
+                else:
+                    with self.phase("evaluate"):
+                        sorted_genomes, fitness_vals = self.sort_by_fitness(population)
+                    population = self.mutate_generation(sorted_genomes, fitness_vals)
+
+                self.ranked = (sorted_genomes, fitness_vals)
+
+                # Keep all-time best genome
+                champion = sorted_genomes[-1].tobytes()
+                if fitness_vals[-1] > best_genome[1]:
+                    best_genome = (champion, fitness_vals[-1])
+
+                snapshot = self.checkpoint(i + 1, population, fitness_vals, best_genome)
+                if checkpoint_file is not None and checkpoint_interval > 0 and (i + 1) % checkpoint_interval == 0:
+                    with self.phase("checkpoint"):
+                        snapshot.save(checkpoint_file)
+
+                migrants = yield GenerationRecord(
+                    generation=i,
+                    min_fitness=fitness_vals[0],
+                    mean_fitness=sum(fitness_vals) / len(fitness_vals),
+                    max_fitness=fitness_vals[-1],
+                    std_fitness=float(np.std(fitness_vals)),
+                    champion=champion,
+                    best=best_genome,
+                    seconds=perf_counter() - start
+                )
+
+                if migrants is not None:
+                    population, fitness_vals = self.immigrate(population, fitness_vals, *migrants)
+                    snapshot = self.checkpoint(i + 1, population, fitness_vals, best_genome)
+
+                # The generation ends once the caller is done with its record, so the profiler covers the caller's
+                # logging and demos too
+                if self.profiler is not None:
+                    self.profiler.end_generation(i)
+        except (KeyboardInterrupt, GeneratorExit):
+            # Interrupted during a generation, or stopped by the caller (which is how an interrupt in the caller's
+            # loop reaches this generator), so save the start of the generation that was to be run next
+            if checkpoint_file is not None:
+                snapshot.save(checkpoint_file)
+                print(f"Training stopped, checkpoint of generation {snapshot.generation} saved in {checkpoint_file}")
+            raise
+
+    def train(
+            self,
+            pop_size,
+            generations,
+            print_interval=10,
+            demo_interval=20,
+            checkpoint_file=None,
+            checkpoint_interval=10,
+            resume_from=None
+    ):
+        # Run iter_train() for a specified number of generations, logging every generation to the output file (see
+        # training_log.py) and printing and demoing its progress
         # Return the all-time best genome found
 
-        # Create population of random genomes of size pop_size
-        population = RobbyTrainer.generate_population(pop_size)
-
         # Initialize all-time best genome variable with an empty genome and the lowest possible fitness value
-        best_genome = ("", -maxsize - 1)
+        best_genome = (b"", -maxsize - 1)
+
+        # Open the training log, continuing the existing one when resuming
+        start_generation = Checkpoint.load(resume_from).generation if resume_from is not None else 0
+        log = TrainingLog(self.output_file, start_generation)
+
+        try:
+            for record in self.iter_train(pop_size, generations, checkpoint_file, checkpoint_interval, resume_from):
+                i = record.generation
+                best_genome = record.best
+
+                with self.phase("logging"):
+                    log.write(record)
+
+                    # Keep the log up to date with every checkpoint
+                    if checkpoint_file is not None and checkpoint_interval > 0 and (i + 1) % checkpoint_interval == 0:
+                        log.flush()
+
+                    # Print out information about the current generation
+                    if print_interval > 0 and i % print_interval == 0:
+                        avg_fitness = round(record.mean_fitness, 2)
+                        print(f"Generation: {i}/{generations}")
+                        print(f"Average fitness this generation: {avg_fitness}")
+                        print(f"Best fitness this generation: {record.max_fitness}")
+                        print('-' * 50)
+
+                # Demo the current generation's best genome, in a world seeded by the generation number
+                if demo_interval > 0 and i % demo_interval == 0:
+                    with self.phase("demo"):
+                        self.demo(record.champion, i)
+        finally:
+            # Keep every generation logged so far, even if training is interrupted
+            log.close()
+
+        # Stop any worker processes
+        self.close()
 
-        # Open output file for writing the best genome's information
-        f = open(self.output_file, 'w')
+        return best_genome
 
-        # Run and mutate the population for n generations
-        for i in range(generations):
-            sorted_genomes, fitness_vals = self.sort_by_fitness(population)
-            population = self.mutate_generation(sorted_genomes, fitness_vals)
 
-            # Keep all-time best genome for final output
-            if fitness_vals[-1] > best_genome[1]:
-                best_genome = (sorted_genomes[-1], fitness_vals[-1])
+# Stands in for a profiler phase when profiling is off
+_NOT_PROFILING = nullcontext()
 
-            # Print out and write to a file information about the current generation
-            if print_interval > 0 and i % print_interval == 0:
-                avg_fitness = round(sum(fitness_vals) / len(fitness_vals), 2)
-                out_string = f"{i} {avg_fitness} {best_genome[1]} {best_genome[0]}\n"
-                f.write(out_string)
 
-                print(f"Generation: {i}/{generations}")
-                print(f"Average fitness this generation: {avg_fitness}")
-                print(f"Best fitness this generation: {fitness_vals[-1]}")
-                print('-' * 50)
+# Each worker process keeps its own copy of the trainer, with its own headless world, for evaluating chunks
 
-            # Demo the current generation's best genome
-            if demo_interval > 0 and i % demo_interval == 0:
-                self.world.demo(sorted_genomes[-1], self.steps, self.can_fill_rate)
-                self.world.graphicsOff()
+_worker_trainer = None
 
-        # Close output file
-        f.close()
 
-        return best_genome
+def _init_worker(trainer):
+    global _worker_trainer
+    _worker_trainer = trainer
+
+
+def _evaluate_chunk(chunk):
+    genomes, seeds, world_ids = chunk
+    return _worker_trainer.evaluate(genomes, seeds, world_ids)
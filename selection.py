@@ -1,29 +1,98 @@
-from random import choices
+import numpy as np
+
+from robby.randomstream import RandomStream
 
 
 class SelectionFunc:
     # Base class, if used will select the first *count* parents from population
+    #
+    # Selection is done by a sampler built once per generation from the weights, which draws the parent indices for
+    # every child of the generation in one call. Subclasses only need to override sampler()
+    #
+    # Steady-state training instead draws a few parents at a time from a SortedPopulation that changes between draws,
+    # with a sampler from population_sampler() giving slots in the population. Drawing from it costs O(log n) per
+    # parent, so subclasses override this too rather than rebuilding a sampler from the weights at every step
+    #
+    # Random numbers come from the rng passed in (a RandomStream or NumPy generator), or a new RandomStream
+    # seeded from the random module if none is given
+
+    def __call__(self, population, weights, count=2, rng=None):
+        # Select *count* parents from population, by drawing a single set of indices from a sampler
+        if rng is None:
+            rng = RandomStream()
+        return [population[i] for i in self.sampler(weights, count)(1, rng)[0]]
+
+    def sampler(self, weights, count=2):
+        # Return a function draw(n, rng) giving an (n, count) array of parent indices into the population
+        def draw(n, rng):
+            return np.tile(np.arange(count), (n, 1))
+        return draw
 
-    def __call__(self, population, weights, count=2):
-        return population[:count]
+    def population_sampler(self, population, count=2):
+        # Return a function draw(n, rng) giving an (n, count) array of parent slots in a SortedPopulation
+        def draw(n, rng):
+            return np.tile([population.slot_at(i) for i in range(count)], (n, 1))
+        return draw
 
 
 class RankedChoiceSelection(SelectionFunc):
     # Randomly select *count* parents from population weighted by *weights*
 
-    def __call__(self, population, weights, count=2):
-        return choices(population=population, weights=weights, k=count)
+    def sampler(self, weights, count=2):
+        # Build the cumulative weights once, then draw each index by binary search like random.choices does
+        cumulative_weights = np.cumsum(weights, dtype=np.float64)
+        total = cumulative_weights[-1]
+        if total <= 0:
+            # Every genome has zero weight, so fall back to choosing uniformly
+            return UniformSelection().sampler(weights, count)
+
+        def draw(n, rng):
+            return np.searchsorted(cumulative_weights, rng.random((n, count)) * total, side="right")
+        return draw
+
+    def population_sampler(self, population, count=2):
+        # Weights are fitness values plus an offset making them all positive, as in RobbyTrainer.mutate_generation(),
+        # so the total weight and each draw come from the population's Fenwick tree
+        def draw(n, rng):
+            offset = abs(population.min_fitness())
+            total = population.total_fitness() + offset * len(population)
+            if total <= 0:
+                return UniformSelection().population_sampler(population, count)(n, rng)
+            targets = rng.random((n, count)) * total
+            return np.array([population.find_weighted(t, offset) for t in targets.flat]).reshape(n, count)
+        return draw
 
 
 class UniformSelection(SelectionFunc):
     # Randomly select *count* parents from population with a uniform distribution
 
-    def __call__(self, population, weights, count=2):
-        return choices(population=population, k=count)
+    def sampler(self, weights, count=2):
+        size = len(weights)
+
+        def draw(n, rng):
+            return rng.integers(0, size, (n, count))
+        return draw
+
+    def population_sampler(self, population, count=2):
+        # Every slot holds one genome, so drawing slots uniformly draws genomes uniformly
+        def draw(n, rng):
+            return rng.integers(0, len(population), (n, count))
+        return draw
 
 
 class NBestSelection(SelectionFunc):
     # Select the n best parents from the given population
 
-    def __call__(self, population, weights, count=2):
-        return [population[-i] for i in range(count)]
+    def sampler(self, weights, count=2):
+        size = len(weights)
+        indices = np.array([-i % size for i in range(count)])
+
+        def draw(n, rng):
+            return np.tile(indices, (n, 1))
+        return draw
+
+    def population_sampler(self, population, count=2):
+        def draw(n, rng):
+            size = len(population)
+            return np.tile([population.slot_at(-i % size) for i in range(count)], (n, 1))
+        return draw
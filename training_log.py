@@ -0,0 +1,103 @@
+import os
+import struct
+
+import numpy as np
+
+from genome import GENOME_LENGTH
+
+# File layout: a fixed-size header followed by fixed-size records, one per generation, in generation order
+HEADER_FORMAT = "<8sII"
+HEADER_SIZE = 16
+MAGIC = b"ROBBYLOG"
+
+# Champions are packed at 3 bits per action code
+BITS_PER_CODE = 3
+PACKED_GENOME_BYTES = -(-GENOME_LENGTH * BITS_PER_CODE // 8)
+
+RECORD_DTYPE = np.dtype([
+    ("generation", "<u4"),
+    ("min_fitness", "<f8"),
+    ("mean_fitness", "<f8"),
+    ("max_fitness", "<f8"),
+    ("std_fitness", "<f8"),
+    ("best_fitness", "<f8"),
+    ("seconds", "<f8"),
+    ("champion", "u1", PACKED_GENOME_BYTES),
+])
+
+
+def pack_genomes(genomes):
+    # Return an (n, PACKED_GENOME_BYTES) array of the given genomes packed at 3 bits per action code
+    genomes = np.asarray(genomes, dtype=np.uint8).reshape(-1, GENOME_LENGTH)
+    bits = np.unpackbits(genomes[:, :, np.newaxis], axis=2)[:, :, -BITS_PER_CODE:]
+    return np.packbits(bits.reshape(len(genomes), -1), axis=1)
+
+
+def unpack_genomes(packed):
+    # Return the (n, 243) matrix of genomes packed by pack_genomes()
+    bits = np.unpackbits(packed, axis=1, count=GENOME_LENGTH * BITS_PER_CODE)
+    return bits.reshape(len(packed), GENOME_LENGTH, BITS_PER_CODE) @ np.array([4, 2, 1], dtype=np.uint8)
+
+
+class TrainingLog:
+    # An append-only binary log with one fixed-size record per generation: its fitness summary (min, mean, max and
+    # standard deviation), the all-time best fitness, the generation's champion packed at 3 bits per action code
+    # and the generation's time in seconds
+    #
+    # Records are buffered in memory and written in chunks of chunk_size. Since every record has the same size, the
+    # whole log reads back as a single NumPy structured array with one column per field
+
+    def __init__(self, filename, start_generation=0, chunk_size=256):
+        # Open a log for writing, starting a new one unless resuming at start_generation, in which case any records
+        # from that generation on are discarded and new records are appended after the rest
+
+        self.filename = filename
+        self.buffer = np.zeros(chunk_size, dtype=RECORD_DTYPE)
+        self.count = 0
+
+        if start_generation > 0 and os.path.exists(filename):
+            kept = np.count_nonzero(TrainingLog.read(filename)["generation"] < start_generation)
+            self.file = open(filename, "r+b")
+            self.file.truncate(HEADER_SIZE + kept * RECORD_DTYPE.itemsize)
+            self.file.seek(0, os.SEEK_END)
+        else:
+            self.file = open(filename, "wb")
+            header = struct.pack(HEADER_FORMAT, MAGIC, RECORD_DTYPE.itemsize, GENOME_LENGTH)
+            self.file.write(header.ljust(HEADER_SIZE, b"\0"))
+
+    def write(self, record):
+        # Add a GenerationRecord to the log
+
+        entry = self.buffer[self.count]
+        entry["generation"] = record.generation
+        entry["min_fitness"] = record.min_fitness
+        entry["mean_fitness"] = record.mean_fitness
+        entry["max_fitness"] = record.max_fitness
+        entry["std_fitness"] = record.std_fitness
+        entry["best_fitness"] = record.best[1]
+        entry["seconds"] = record.seconds
+        entry["champion"] = pack_genomes(np.frombuffer(record.champion, dtype=np.uint8))[0]
+
+        self.count += 1
+        if self.count == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        # Write any buffered records to the file
+        self.file.write(self.buffer[:self.count].tobytes())
+        self.file.flush()
+        self.count = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    @staticmethod
+    def read(filename):
+        # Return every record in a log as a NumPy structured array, in generation order
+
+        with open(filename, "rb") as f:
+            magic, record_size, genome_length = struct.unpack(HEADER_FORMAT, f.read(struct.calcsize(HEADER_FORMAT)))
+        if magic != MAGIC or record_size != RECORD_DTYPE.itemsize or genome_length != GENOME_LENGTH:
+            raise ValueError(f"{filename} is not a training log file")
+        return np.fromfile(filename, dtype=RECORD_DTYPE, offset=HEADER_SIZE)
@@ -0,0 +1,63 @@
+from multiprocessing import get_context
+from queue import Empty
+
+from genome import to_string
+
+
+class DemoViewer:
+    # Demos genomes in a separate viewer process with its own robby.World window, so that training isn't paused
+    # while a demo animates
+    #
+    # Requests are sent through a queue as just a genome and a seed, which the viewer uses to seed its world's
+    # RandomStream before the demo, as the trainer does for the world each genome is evaluated in, so each demo's can
+    # layout and random moves are reproducible. The viewer only ever shows the newest request: any that arrive while
+    # a demo is running are dropped except for the last one
+
+    def __init__(self, num_rows, num_cols, steps=200, can_fill_rate=0.25):
+        # Spawn rather than fork the viewer, so it starts its own Tk without inheriting any state from the trainer
+        context = get_context("spawn")
+        self.requests = context.Queue()
+        self.process = context.Process(
+            target=_run_viewer,
+            args=(self.requests, num_rows, num_cols, steps, can_fill_rate),
+            daemon=True
+        )
+        self.process.start()
+
+    def show(self, genome, seed):
+        # Ask the viewer to demo a genome (as bytes or a string) in the world generated from seed, without waiting
+        if not isinstance(genome, str):
+            genome = to_string(genome)
+        self.requests.put((genome, seed))
+
+    def close(self):
+        # Stop the viewer once it has finished its current demo
+        self.requests.put(None)
+        self.process.join()
+        self.requests.close()
+
+
+def _latest_request(requests):
+    # Wait for a request, then skip to the newest one that is waiting, if any
+    request = requests.get()
+    while request is not None:
+        try:
+            request = requests.get_nowait()
+        except Empty:
+            break
+    return request
+
+
+def _run_viewer(requests, num_rows, num_cols, steps, can_fill_rate):
+    import robby
+    from robby.randomstream import RandomStream
+
+    world = robby.World(num_rows, num_cols, RandomStream())
+    while True:
+        request = _latest_request(requests)
+        if request is None:
+            break
+        genome, seed = request
+        world.model.seed(seed)
+        world.demo(genome, steps, can_fill_rate)
+    world.close()
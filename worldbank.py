@@ -0,0 +1,78 @@
+import struct
+from random import getrandbits
+
+import numpy as np
+
+# File layout: a fixed-size header followed by the packed layouts, one row of bytes per world
+HEADER_FORMAT = "<8sIIIQ"
+HEADER_SIZE = 32
+MAGIC = b"ROBBYBNK"
+
+
+class WorldBank:
+    # A bank of pre-generated can layouts that genomes can be evaluated on instead of freshly distributed worlds
+    #
+    # Layouts are stored one bit per cell (1 for a can), packed into a (count, ceil(rows * cols / 8)) uint8 array.
+    # Banks can be saved to disk and loaded back memory-mapped, so worker processes can share one bank without
+    # copying it: a loaded bank pickles as just its file name and is mapped again on unpickling. Each world also
+    # has its own seed, used for the random moves Robby makes in it
+
+    def __init__(self, packed, num_rows, num_cols, seed, filename=None):
+        self.packed = packed
+        self.num_rows = num_rows
+        self.num_cols = num_cols
+        self.seed = seed
+        self.filename = filename
+
+    def __len__(self):
+        return len(self.packed)
+
+    @classmethod
+    def generate(cls, count, num_rows, num_cols, can_fill_rate=0.25, seed=None):
+        # Return a bank of count random layouts, reproducible from seed, or from the random module if seed is None
+
+        if seed is None:
+            seed = getrandbits(64)
+        rng = np.random.default_rng(seed)
+        cans = rng.random((count, num_rows * num_cols)) < can_fill_rate
+        return cls(np.packbits(cans, axis=1), num_rows, num_cols, seed)
+
+    @classmethod
+    def load(cls, filename):
+        # Return the bank saved in a file, memory-mapped read-only
+
+        with open(filename, "rb") as f:
+            magic, count, num_rows, num_cols, seed = struct.unpack(HEADER_FORMAT, f.read(struct.calcsize(HEADER_FORMAT)))
+        if magic != MAGIC:
+            raise ValueError(f"{filename} is not a world bank file")
+        row_bytes = -(-num_rows * num_cols // 8)
+        packed = np.memmap(filename, dtype=np.uint8, mode="r", offset=HEADER_SIZE, shape=(count, row_bytes))
+        return cls(packed, num_rows, num_cols, seed, filename)
+
+    def save(self, filename):
+        # Write the bank to a file that load() can memory-map
+
+        with open(filename, "wb") as f:
+            header = struct.pack(HEADER_FORMAT, MAGIC, len(self), self.num_rows, self.num_cols, self.seed)
+            f.write(header.ljust(HEADER_SIZE, b"\0"))
+            f.write(np.ascontiguousarray(self.packed).tobytes())
+
+    def __getstate__(self):
+        # Memory-mapped banks are shared through their file rather than copied
+        state = self.__dict__.copy()
+        if self.filename is not None:
+            state["packed"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.packed is None:
+            self.packed = WorldBank.load(self.filename).packed
+
+    def layouts(self, indices):
+        # Return an (len(indices), rows * cols) uint8 array of the given layouts, with 1 (CAN) wherever there is a can
+        return np.unpackbits(self.packed[indices], axis=1, count=self.num_rows * self.num_cols)
+
+    def world_seeds(self, indices):
+        # Return the random move seed of each of the given worlds
+        return [(self.seed + int(i)) % 2 ** 64 for i in indices]